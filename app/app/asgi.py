@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+# Recipe list, detail and image upload have async views, see
+# recipe.async_views.
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'app.asgi_urls')
 
 application = get_asgi_application()
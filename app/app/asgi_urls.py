@@ -0,0 +1,11 @@
+"""
+URL configuration served under ASGI (see app.asgi): app.urls, with the
+recipe endpoints that have an async path routed to it.
+"""
+from django.urls import include, path
+
+from app import urls
+
+urlpatterns = [
+    path('api/recipe/', include('recipe.async_urls')),
+] + urls.urlpatterns
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -56,7 +57,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+# app.asgi serves app.asgi_urls, routing recipes to their async views
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'app.urls')
 
 TEMPLATES = [
     {
@@ -91,6 +93,33 @@ DATABASES = {
 }
 
 
+# Authentication and password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+
+AUTHENTICATION_BACKENDS = ['user.backends.PooledModelBackend']
+
+# Passwords are hashed with PBKDF2 at the work factor of the selected
+# tier; raising the tier upgrades stored hashes as users sign in.
+PASSWORD_HASHERS = [
+    'user.hashers.TieredPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASHER_TIERS = {
+    'standard': 260000,
+    'strong': 600000,
+}
+PASSWORD_HASHER_TIER = os.environ.get('PASSWORD_HASHER_TIER', 'standard')
+
+# Processes hashing passwords (0 hashes on the request thread) and the
+# number of hashing jobs admitted at once before sign-ins get a 503
+PASSWORD_HASHING_WORKERS = int(os.environ.get(
+    'PASSWORD_HASHING_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASHING_MAX_PENDING = int(os.environ.get(
+    'PASSWORD_HASHING_MAX_PENDING', 4 * max(PASSWORD_HASHING_WORKERS, 1)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -144,6 +173,77 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# The default cache holds the version counters that retire cached token
+# lookups, list responses, autocomplete indexes and ETags after writes
+# (core.versions), so every process serving the app must share it. The
+# LocMemCache fallback is one cache per process: it only suits a single
+# process, and the `core.E001` check refuses it with SERVER_PROCESSES
+# above 1. Use Redis or Memcached through CACHE_BACKEND otherwise.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Processes serving the app, such as gunicorn workers
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', 1))
+
+# Seconds a cached list response may live; writes retire it earlier
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Number of per-user autocomplete indexes each process keeps in memory
+AUTOCOMPLETE_INDEX_MAX_USERS = int(
+    os.environ.get('AUTOCOMPLETE_INDEX_MAX_USERS', 256))
+
+# Image uploads are streamed to disk in chunks of this many bytes and
+# rejected past the size or pixel count limit before being decoded
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get(
+    'IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.environ.get(
+    'IMAGE_UPLOAD_MAX_PIXELS', 40 * 1000 * 1000))
+
+# Processes resizing uploaded images (0 resizes inline after the upload)
+IMAGE_VARIANT_WORKERS = int(os.environ.get(
+    'IMAGE_VARIANT_WORKERS', min(2, os.cpu_count() or 1)))
+
+# On-the-fly resized images: widest rendition served, and where and how
+# much of them to keep on disk
+IMAGE_RENDITION_MAX_WIDTH = int(os.environ.get(
+    'IMAGE_RENDITION_MAX_WIDTH', 2048))
+IMAGE_RENDITION_CACHE_DIR = os.path.join(MEDIA_ROOT, 'renditions')
+IMAGE_RENDITION_CACHE_MAX_BYTES = int(os.environ.get(
+    'IMAGE_RENDITION_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Recipe image files are served by the API after a permission check
+# (MEDIA_PROTECTED), which hands the transfer to the front proxy: 'nginx'
+# (X-Accel-Redirect to the internal location below), 'sendfile'
+# (X-Sendfile) or 'django' to stream the file from the application
+MEDIA_PROTECTED = bool(int(os.environ.get('MEDIA_PROTECTED', 1)))
+MEDIA_SERVE_BACKEND = os.environ.get('MEDIA_SERVE_BACKEND', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Threads the async recipe views run ORM calls on, and threads writing
+# uploaded files (0 runs both on the request's thread, as in tests). An
+# ASGI process opens at most one database connection per thread of both
+ASYNC_ORM_THREADS = int(os.environ.get('ASYNC_ORM_THREADS', 8))
+ASYNC_FILE_THREADS = int(os.environ.get('ASYNC_FILE_THREADS', 4))
+
+# Seconds a resolved auth token is trusted without a database lookup, and
+# the number of tokens each process keeps in memory
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(
+    os.environ.get('AUTH_TOKEN_CACHE_MAX_ENTRIES', 1024))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Your Project API',
     'DESCRIPTION': 'Your project description',
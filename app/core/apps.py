@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import checks, receivers  # noqa: F401
+        from core.search import install_sqlite_fts
+
+        post_migrate.connect(install_sqlite_fts, sender=self)
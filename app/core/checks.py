@@ -0,0 +1,15 @@
+from core.versions import is_shared
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+
+    return [Error(
+        'The default cache is kept in each process, but SERVER_PROCESSES '
+        'processes serve the app: writes would only retire cached data in '
+        'the process making them.',
+        hint='Point CACHE_BACKEND at Redis or Memcached.',
+        id='core.E001')]
@@ -0,0 +1,191 @@
+"""
+Resized variants of recipe images.
+
+Every uploaded image gets a JPEG and a WebP rendition per size in
+VARIANTS, stored in the image storage under `variants/`. Resizing is CPU
+bound, so it runs in a process pool after the upload has committed; the
+worker only renders and the parent saves the files and records them on
+the recipe, guarded by the image name so a newer upload is never
+overwritten with variants of an older one.
+
+`IMAGE_VARIANT_WORKERS = 0` generates variants inline.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+# Longest edge in pixels; images are never upscaled.
+VARIANTS = {
+    'large': 1200,
+    'medium': 600,
+    'thumb': 150,
+}
+FORMATS = {
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True,
+             'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+
+EXIF_ORIENTATION = 0x0112
+
+_executor = None
+_lock = threading.Lock()
+
+
+def image_storage():
+    from core.models import Recipe
+
+    return Recipe._meta.get_field('image').storage
+
+
+def variant_name(name, variant, extension):
+    """Name to save a variant under; the storage turns it into a content
+    address in the same directory"""
+    directory = os.path.dirname(name)
+    return os.path.join(directory, 'variants', f'{variant}.{extension}')
+
+
+def render_variants(name):
+    """
+    Render all variants of the stored image `name` and return their
+    `{variant: {extension: bytes}}` map. Runs in a worker process.
+    """
+    with image_storage().open(name) as source:
+        image = Image.open(source)
+        # Let the JPEG decoder downscale by a power of two while reading.
+        image.draft('RGB', (VARIANTS['large'], VARIANTS['large']))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        rendered = {}
+        # Largest first, so every size is resampled from the one before.
+        for variant, edge in sorted(VARIANTS.items(),
+                                    key=lambda item: -item[1]):
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            rendered[variant] = {}
+            for extension, options in FORMATS.items():
+                buffer = BytesIO()
+                image.save(buffer, **options)
+                rendered[variant][extension] = buffer.getvalue()
+
+    return rendered
+
+
+def render_resized(name, width, image_format, quality):
+    """
+    Return the stored image `name` scaled down to `width` pixels (never
+    up) and encoded as `image_format` ('jpeg' or 'webp') at `quality`.
+    """
+    with image_storage().open(name) as source:
+        image = Image.open(source)
+        # Orientations 5-8 are rotated by 90 degrees when transposed.
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+        scale = min(1, width / (image.height if rotated else image.width))
+        # JPEGs are decoded at the smallest power-of-two scale still at
+        # least this size, which skips most of the decoding work.
+        image.draft('RGB', (math.ceil(image.width * scale),
+                            math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((width, image.height), Image.LANCZOS)
+
+        options = dict(FORMATS[image_format], quality=quality)
+        buffer = BytesIO()
+        image.save(buffer, **options)
+
+    return buffer.getvalue()
+
+
+def delete_variants(variants):
+    storage = image_storage()
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def release_image(name, variants):
+    """Drop a reference to an image and its variants"""
+    if name:
+        image_storage().delete(name)
+    delete_variants(variants)
+
+
+def store_variants(recipe_id, name, rendered):
+    """Save rendered variants of `name` and record them on the recipe,
+    unless it has a new image by now"""
+    from core.models import Recipe
+
+    storage = image_storage()
+    with transaction.atomic():
+        recipe = (Recipe.objects.select_for_update()
+                  .filter(pk=recipe_id, image=name).first())
+        if recipe is None:
+            return False
+
+        variants = {
+            variant: {
+                extension: storage.save(
+                    variant_name(name, variant, extension),
+                    ContentFile(data))
+                for extension, data in formats.items()
+            }
+            for variant, formats in rendered.items()
+        }
+        stale = recipe.image_variants
+        recipe.image_variants = variants
+        recipe.save(update_fields=['image_variants', 'updated_at'])
+        # Only once the row no longer lists them: a rollback keeps them.
+        transaction.on_commit(lambda: delete_variants(stale))
+
+    return True
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                initializer=_init_worker)
+
+        return _executor
+
+
+def _on_rendered(recipe_id, name, future):
+    try:
+        store_variants(recipe_id, name, future.result())
+    finally:
+        close_old_connections()
+
+
+def generate_variants(recipe):
+    """Queue variant generation for the recipe's current image once the
+    surrounding transaction commits"""
+    recipe_id, name = recipe.pk, recipe.image.name
+    if not name:
+        return
+
+    def submit():
+        if not settings.IMAGE_VARIANT_WORKERS:
+            store_variants(recipe_id, name, render_variants(name))
+            return
+
+        future = get_executor().submit(render_variants, name)
+        future.add_done_callback(
+            lambda future: _on_rendered(recipe_id, name, future))
+
+    transaction.on_commit(submit)
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from core.models import Recipe
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from recipe import async_views
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    help = ('Compare WSGI and ASGI serving of recipe reads under load, '
+            'with the same thread budget: the WSGI workers against the '
+            'ASGI ORM pool')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User whose recipes are read')
+        parser.add_argument('--endpoint', choices=['list', 'detail'],
+                            default='list')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Requests in flight under ASGI')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='WSGI worker threads and ASGI ORM threads')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Milliseconds added to every query, as '
+                                 'for a database across the network')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Report peak Python allocations, at the '
+                                 'cost of much slower requests')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No such user: {options["email"]}')
+
+        if options['endpoint'] == 'list':
+            path = reverse('recipe:recipe-list')
+        else:
+            recipe = Recipe.objects.filter(user=user).first()
+            if recipe is None:
+                raise CommandError('The user has no recipes')
+            path = reverse('recipe:recipe-detail', args=[recipe.id])
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'authorization': f'Token {token.key}'}
+
+        latency = options['db_latency'] / 1000
+        self.stdout.write(
+            f'{options["requests"]} requests to {path}, '
+            f'{options["threads"]} threads, ASGI concurrency '
+            f'{options["concurrency"]}, {options["db_latency"]} ms/query')
+
+        bodies = {}
+        # Every request misses the response cache, and comes from the
+        # request factories' host.
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0,
+                               ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,
+                                              'testserver'],
+                               ASYNC_ORM_THREADS=options['threads'],
+                               ASYNC_FILE_THREADS=1), \
+                _QueryLatency(latency):
+            for name, run in [('wsgi', self._run_wsgi),
+                              ('asgi', self._run_asgi)]:
+                bodies[name], result = self._measure(
+                    run, path, headers, options)
+                self.stdout.write(f'{name:<5} {result}')
+            async_views.shutdown_executors()
+
+        if bodies['wsgi'] != bodies['asgi']:
+            raise CommandError('WSGI and ASGI rendered different bodies')
+        self.stdout.write(self.style.SUCCESS('Bodies are identical'))
+
+    def _measure(self, run, path, headers, options):
+        threads = _PeakThreads()
+        if options['trace_memory']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with threads:
+                responses = run(path, headers, options)
+            elapsed = time.perf_counter() - started
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        failed = [response.status_code for response in responses
+                  if response.status_code != 200]
+        if failed:
+            raise CommandError(f'Requests failed with {failed[0]}')
+
+        result = (f'{len(responses) / elapsed:8.1f} req/s  '
+                  f'{threads.peak:4d} threads')
+        if options['trace_memory']:
+            result += f'  {peak_memory / 1024 / 1024:7.1f} MiB allocated'
+        return responses[0].content, result
+
+    def _run_wsgi(self, path, headers, options):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        extra = {f'HTTP_{name.upper()}': value
+                 for name, value in headers.items()}
+
+        def get(_):
+            request = factory.get(path, **extra)
+            request.urlconf = 'app.urls'
+            try:
+                return handler.get_response(request)
+            finally:
+                # As WSGIHandler does when the request finishes.
+                close_old_connections()
+
+        # A worker thread serves one request at a time.
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            return list(pool.map(get, range(options['requests'])))
+
+    def _run_asgi(self, path, headers, options):
+        handler = ASGIHandler()
+        factory = AsyncRequestFactory()
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def get():
+            async with slots:
+                request = factory.get(path, **headers)
+                request.urlconf = 'app.asgi_urls'
+                return await handler.get_response_async(request)
+
+        async def run():
+            return await asyncio.gather(
+                *[get() for _ in range(options['requests'])])
+
+        return async_to_sync(run)()
+
+
+class _PeakThreads:
+    """Sample the process's thread count while the block runs"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def __enter__(self):
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._sampler.join()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            # Leave the sampler itself out.
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+
+class _QueryLatency:
+    """Delay every query on every connection opened in the block"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __enter__(self):
+        if self.seconds:
+            connection_created.connect(self._install)
+            for connection in connections.all():
+                self._install(connection=connection)
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self._install)
+        for connection in connections.all():
+            if self._wait in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self._wait)
+
+    def _install(self, connection, **kwargs):
+        # Sent again each time a connection object reconnects.
+        if self._wait not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._wait)
+
+    def _wait(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+from user.hashing import HashingPool, HashingUnavailable
+
+
+class Command(BaseCommand):
+    help = 'Measure password verification throughput per hashing pool size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool-sizes', default='0,1,2,4',
+                            help='Comma separated worker counts, 0 hashes '
+                                 'on the calling thread')
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Simultaneous sign-ins')
+        parser.add_argument('--max-pending', type=int,
+                            help='Admission limit, defaults to --concurrency')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['pool_sizes'].split(',')]
+        logins = options['logins']
+        concurrency = options['concurrency']
+        max_pending = options['max_pending'] or concurrency
+        encoded = hashers.make_password('benchmark-password')
+
+        self.stdout.write(f'{logins} logins, {concurrency} concurrent, '
+                          f'admitting {max_pending}')
+        for size in sizes:
+            pool = HashingPool(size, max_pending)
+            try:
+                # Start the workers outside the measured run.
+                pool.verify_password('benchmark-password', encoded)
+                elapsed, shed = self._run(pool, encoded, logins, concurrency)
+            finally:
+                pool.shutdown()
+
+            served = logins - shed
+            self.stdout.write(
+                f'workers={size:<3} {served / elapsed:8.1f} logins/s  '
+                f'{shed} shed  {elapsed:.2f}s')
+
+    def _run(self, pool, encoded, logins, concurrency):
+        def login(_):
+            try:
+                pool.verify_password('benchmark-password', encoded)
+                return 0
+            except HashingUnavailable:
+                return 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            shed = sum(executor.map(login, range(logins)))
+
+        return time.perf_counter() - started, shed
@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from recipe.views import IngredientViewSet, RecipesViewSet, TagViewSet
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+VIEWSETS = {
+    'recipes': RecipesViewSet,
+    'tags': TagViewSet,
+    'ingredients': IngredientViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare the serializer, values() and stored document read '
+            'paths of a list endpoint for one user')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User whose data is listed')
+        parser.add_argument('--endpoint', choices=VIEWSETS,
+                            default='recipes')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--fields',
+                            help='Sparse fieldset, e.g. id,title')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No such user: {options["email"]}')
+
+        params = {'page_size': options['page_size']}
+        if options['fields']:
+            params['fields'] = options['fields']
+        viewset = VIEWSETS[options['endpoint']]
+        # Only recipes have stored documents to read.
+        documents = ({'document_reads': False}
+                     if hasattr(viewset, 'document_reads') else {})
+        paths = [
+            ('serializer', viewset.as_view(
+                {'get': 'list'}, fast_list=False,
+                renderer_classes=[JSONRenderer], **documents)),
+            ('values', viewset.as_view({'get': 'list'}, **documents)),
+        ]
+        if documents:
+            paths.append(('documents', viewset.as_view({'get': 'list'})))
+
+        bodies = {}
+        # Every request misses the response cache.
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+            for name, view in paths:
+                bodies[name] = self._get(view, user, params)
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    self._get(view, user, params)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{name:<11} {options["requests"] / elapsed:8.1f} req/s  '
+                    f'{elapsed / options["requests"] * 1000:7.2f} ms/req  '
+                    f'{len(bodies[name])} bytes')
+
+        if len(set(bodies.values())) > 1:
+            raise CommandError('The paths rendered different bodies')
+        self.stdout.write(self.style.SUCCESS('Bodies are identical'))
+
+    def _get(self, view, user, params):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=user)
+        response = view(request)
+        if response.status_code != 200:
+            raise CommandError(f'List failed with {response.status_code}')
+
+        return response.render().content
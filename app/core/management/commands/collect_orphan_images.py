@@ -0,0 +1,225 @@
+import json
+import os
+import time
+from itertools import islice
+
+from core import models
+from core.images import image_storage
+from core.models import Recipe, StoredFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe image files that nothing references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-rate', type=float, default=2000,
+                            help='Files examined per second at most, '
+                                 '0 for no limit')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Seconds a file must exist before it can '
+                                 'be collected, covering uploads whose '
+                                 'transaction has not committed yet')
+        parser.add_argument('--checkpoint',
+                            help='Defaults to .collect_orphan_images.json '
+                                 'in the storage root')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        self.location = os.path.abspath(storage.location)
+        root = os.path.join(self.location, models.RECIPE_IMAGE_DIR)
+        checkpoint = options['checkpoint'] or os.path.join(
+            self.location, '.collect_orphan_images.json')
+        batch_size = options['batch_size']
+        max_rate = options['max_rate']
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['min_age']
+
+        position = self._read_checkpoint(checkpoint)
+        if position:
+            directory, after = position
+            self.stdout.write(f'Resuming in {directory} after {after}'
+                              if after else f'Resuming in {directory}')
+        verb = 'Would delete' if dry_run else 'Deleted'
+        verbose = options['verbosity'] > 1
+
+        scanned = deleted = freed = 0
+        started = time.monotonic()
+        files = (self._walk(root, position)
+                 if os.path.isdir(root) else iter(()))
+        while True:
+            batch = list(islice(files, batch_size))
+            if not batch:
+                break
+
+            removed = set()
+            for name, size in self._orphans(batch, cutoff):
+                if not dry_run:
+                    if not self._collect(name, cutoff):
+                        continue
+                    removed.add(name)
+                if verbose:
+                    self.stdout.write(f'{verb} {name}')
+                deleted += 1
+                freed += size
+
+            # Resume from the last file still there: a deleted one no
+            # longer shows up in the listing to be found again.
+            for name, stat in batch:
+                directory, filename = name.rsplit('/', 1)
+                if position is None or position[0] != directory:
+                    position = [directory, None]
+                if name not in removed:
+                    position = [directory, filename]
+
+            scanned += len(batch)
+            if not dry_run:
+                self._write_checkpoint(checkpoint, position)
+            if max_rate:
+                # Spread the I/O out instead of hammering the disk.
+                delay = scanned / max_rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+        # A finished pass starts over from the beginning next time.
+        if os.path.exists(checkpoint) and not dry_run:
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Examined {scanned} files, {verb.lower()} {deleted} '
+            f'({freed} bytes)'))
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.location).replace(os.sep, '/')
+
+    def _walk(self, directory, position=None):
+        """
+        Yield `(name, stat)` of the files below `directory`. Each
+        directory's files come first, streamed in listing order so that
+        not even the flat legacy directory is held in memory, then its
+        subdirectories (a few hundred shards at most) in name order.
+
+        `position` is the checkpoint's `[directory, name]`: everything
+        before that directory is skipped, and in it everything up to and
+        including `name`, the last file the previous run kept.
+        """
+        relative = self._relative(directory)
+        if position and position[0] == relative:
+            yield from self._files(directory, position[1])
+            position = None
+        elif position and position[0].startswith(relative + '/'):
+            # An ancestor of the checkpoint, whose files are done.
+            branch = position[0][len(relative) + 1:].split('/')[0]
+        else:
+            yield from self._files(directory)
+            position = None
+
+        with os.scandir(directory) as entries:
+            subdirectories = sorted(
+                entry.name for entry in entries
+                if entry.is_dir(follow_symlinks=False) and
+                not entry.name.startswith('.'))
+        for subdirectory in subdirectories:
+            path = os.path.join(directory, subdirectory)
+            if position is None:
+                yield from self._walk(path)
+            elif subdirectory == branch:
+                yield from self._walk(path, position)
+            elif subdirectory > branch:
+                yield from self._walk(path)
+
+    def _files(self, directory, after=None):
+        """Stream the files of a directory, starting past the file named
+        `after`, or over from the top if it has gone since"""
+        if after is not None:
+            entries = self._entries(directory)
+            for entry in entries:
+                if entry.name == after:
+                    yield from self._stat(entries)
+                    return
+
+        yield from self._stat(self._entries(directory))
+
+    def _entries(self, directory):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if (not entry.name.startswith('.') and
+                        entry.is_file(follow_symlinks=False)):
+                    yield entry
+
+    def _stat(self, entries):
+        for entry in entries:
+            try:
+                yield (self._relative(entry.path),
+                       entry.stat(follow_symlinks=False))
+            except FileNotFoundError:
+                continue
+
+    def _orphans(self, batch, cutoff):
+        """Yield `(name, size)` of the unreferenced files in the batch"""
+        names = [name for name, stat in batch if stat.st_mtime < cutoff]
+        referenced = set(Recipe.objects.filter(image__in=names)
+                         .values_list('image', flat=True))
+        referenced.update(StoredFile.objects.filter(name__in=names)
+                          .values_list('name', flat=True))
+        sizes = {name: stat.st_size for name, stat in batch}
+
+        for name in names:
+            if name not in referenced:
+                yield name, sizes[name]
+
+    def _collect(self, name, cutoff):
+        """
+        Delete the orphan `name` unless it has been stored again since
+        the batch was checked, returning whether it was. A placeholder
+        `StoredFile` row holds the name's lock meanwhile: an upload of the
+        same content waits on it in `acquire()`, then finds the file gone
+        and writes it again. A stored file that gained references has a
+        row or, on a dedup hit, a new mtime.
+        """
+        path = os.path.join(self.location, name)
+        with transaction.atomic():
+            if StoredFile.objects.select_for_update().filter(
+                    name=name).exists():
+                return False
+            try:
+                with transaction.atomic():
+                    placeholder = StoredFile.objects.create(
+                        name=name, refcount=0)
+            except IntegrityError:
+                return False
+
+            try:
+                if (os.stat(path).st_mtime >= cutoff or
+                        Recipe.objects.filter(image=name).exists()):
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+            finally:
+                placeholder.delete()
+
+        return True
+
+    def _read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+
+        if state['location'] != self.location:
+            raise CommandError(
+                f'Checkpoint {checkpoint} belongs to {state["location"]}')
+
+        return state['position']
+
+    def _write_checkpoint(self, checkpoint, position):
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as checkpoint_file:
+            json.dump({'location': self.location, 'position': position},
+                      checkpoint_file)
+        os.replace(tmp, checkpoint)
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from core import images
+from core.models import Recipe
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate resized variants for recipe images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Resizing processes, 0 resizes inline')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate existing variants too')
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.exclude(image='').exclude(image=None)
+        if not options['force']:
+            queryset = queryset.filter(image_variants={})
+        recipes = queryset.values_list('id', 'image').iterator()
+        workers = options['workers']
+
+        self.stored = self.failed = 0
+        if not workers:
+            for recipe_id, name in recipes:
+                self._store(recipe_id, name, images.render_variants, name)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self._run(executor, recipes, max_pending=workers * 4)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {self.stored} images, '
+            f'{self.failed} failed'))
+
+    def _run(self, executor, recipes, max_pending):
+        """Keep at most `max_pending` images queued so a large backlog is
+        never materialized in memory"""
+        pending = {}
+        for recipe_id, name in recipes:
+            future = executor.submit(images.render_variants, name)
+            pending[future] = (recipe_id, name)
+            if len(pending) >= max_pending:
+                self._collect(pending, FIRST_COMPLETED)
+        self._collect(pending)
+
+    def _collect(self, pending, return_when='ALL_COMPLETED'):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            recipe_id, name = pending.pop(future)
+            self._store(recipe_id, name, future.result)
+
+    def _store(self, recipe_id, name, render, *args):
+        try:
+            variants = render(*args)
+        except OSError as exc:
+            self.failed += 1
+            self.stderr.write(f'Recipe {recipe_id} ({name}) failed: {exc}')
+            return
+
+        if images.store_variants(recipe_id, name, variants):
+            self.stored += 1
@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import dropwhile, islice
+
+from core import recipe_io
+from core.models import Ingredient, Recipe, Tag
+from core.signals import bulk_created
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipe import documents
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class Command(BaseCommand):
+    help = 'Import recipes for a user from an NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help='Email of the user owning the recipes')
+        parser.add_argument('--format', choices=['ndjson', 'csv'],
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint',
+                            help='Defaults to <path>.checkpoint')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the records of the last checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            self.user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+
+        file_format = options['format'] or self._guess_format(path)
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        batch_size = options['batch_size']
+        use_copy = connection.vendor == 'postgresql'
+
+        done = (self._read_checkpoint(checkpoint, path)
+                if options['resume'] else 0)
+        imported = errors = 0
+        started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8') as source:
+            records = self._parse(source, file_format)
+            if done:
+                self.stdout.write(f'Resuming after record {done}')
+                records = dropwhile(lambda item: item[0] <= done, records)
+
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+
+                rows = []
+                for number, record in batch:
+                    try:
+                        if file_format == 'ndjson':
+                            record = json.loads(record)
+                        rows.append(self._build(record))
+                    except (KeyError, ValueError, TypeError,
+                            InvalidOperation, ValidationError) as exc:
+                        errors += 1
+                        self.stderr.write(f'Record {number} skipped: {exc}')
+
+                with transaction.atomic(), documents.deferred():
+                    self._write(rows, use_copy)
+
+                done = batch[-1][0]
+                imported += len(rows)
+                self._write_checkpoint(checkpoint, path, done)
+
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{done} records read, {imported} recipes imported, '
+                    f'{errors} skipped ({rate:.0f} recipes/s)')
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {errors}'))
+
+    def _guess_format(self, path):
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        if extension in ['ndjson', 'jsonl']:
+            return 'ndjson'
+        if extension == 'csv':
+            return 'csv'
+
+        raise CommandError('Cannot guess the format, pass --format')
+
+    def _parse(self, source, file_format):
+        """Yield `(number, record)` pairs: CSV rows by their position,
+        NDJSON lines undecoded by their line number, so that a malformed
+        line is skipped like any other invalid record"""
+        if file_format == 'csv':
+            yield from enumerate(csv.DictReader(source), start=1)
+            return
+
+        for number, line in enumerate(source, start=1):
+            line = line.strip()
+            if line:
+                yield number, line
+
+    def _build(self, record):
+        recipe = Recipe(
+            user=self.user,
+            title=record['title'],
+            description=record.get('description') or '',
+            price=Decimal(str(record['price'])),
+            time_minutes=int(record['time_minutes']),
+            link=record.get('link') or '',
+        )
+        recipe.clean_fields(exclude=['id', 'user', 'image'])
+
+        return (recipe,
+                self._names(Tag, record.get('tags')),
+                self._names(Ingredient, record.get('ingredients')))
+
+    def _names(self, model, value):
+        """Tag or ingredient names of a record, checked as the model's
+        field would before anything is written"""
+        names = set(recipe_io.split_names(value))
+        field = model._meta.get_field('name')
+        for name in names:
+            field.run_validators(name)
+
+        return names
+
+    def _write(self, rows, use_copy):
+        if not rows:
+            return
+
+        recipes = [recipe for recipe, tags, ingredients in rows]
+        for recipe_id, recipe in zip(
+                Recipe.objects.reserve_ids(len(recipes)), recipes):
+            recipe.id = recipe_id
+
+        tags = Tag.objects.get_or_create_by_names(
+            self.user, set().union(*(tags for _, tags, _ in rows)))
+        ingredients = Ingredient.objects.get_or_create_by_names(
+            self.user, set().union(*(names for _, _, names in rows)))
+
+        recipe_tags = [
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tags[name].id)
+            for recipe, names, _ in rows for name in names]
+        recipe_ingredients = [
+            Recipe.ingredients.through(
+                recipe_id=recipe.id, ingredient_id=ingredients[name].id)
+            for recipe, _, names in rows for name in names]
+
+        for model, objs in [(Recipe, recipes),
+                            (Recipe.tags.through, recipe_tags),
+                            (Recipe.ingredients.through, recipe_ingredients)]:
+            if use_copy:
+                self._copy(model, objs)
+            else:
+                model.objects.bulk_create(objs)
+            bulk_created.send(sender=model, instances=objs)
+
+    def _copy(self, model, objs):
+        """Stream model instances into their table with COPY FROM STDIN"""
+        if not objs:
+            return
+
+        opts = model._meta
+        fields = [field for field in opts.concrete_fields
+                  if not (field.primary_key and objs[0].pk is None)]
+        buffer = io.StringIO()
+        for obj in objs:
+            values = (field.get_db_prep_save(field.pre_save(obj, True),
+                                             connection)
+                      for field in fields)
+            buffer.write('\t'.join(map(copy_value, values)) + '\n')
+        buffer.seek(0)
+
+        columns = ', '.join(connection.ops.quote_name(field.column)
+                            for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(opts.db_table)} '
+                f'({columns}) FROM STDIN', buffer)
+
+    def _read_checkpoint(self, checkpoint, path):
+        try:
+            with open(checkpoint) as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+
+        if state['source'] != os.path.abspath(path):
+            raise CommandError(
+                f'Checkpoint {checkpoint} belongs to {state["source"]}')
+
+        return state['records']
+
+    def _write_checkpoint(self, checkpoint, path, records):
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as checkpoint_file:
+            json.dump({'source': os.path.abspath(path),
+                       'records': records}, checkpoint_file)
+        os.replace(tmp, checkpoint)
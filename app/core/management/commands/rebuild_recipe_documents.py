@@ -0,0 +1,38 @@
+from core.models import Recipe, RecipeDocument
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipe import documents
+
+
+class Command(BaseCommand):
+    help = ('Render the stored JSON documents of recipes again, after '
+            'deploys changing the API output or writes that bypassed '
+            'signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='emails',
+                            help='Only rebuild this user (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('id')
+        if options['emails']:
+            users = dict(get_user_model().objects.filter(
+                email__in=options['emails']).values_list('email', 'id'))
+            missing = set(options['emails']).difference(users)
+            if missing:
+                raise CommandError(
+                    f'No such user: {", ".join(sorted(missing))}')
+            recipes = recipes.filter(user_id__in=users.values())
+
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            with transaction.atomic():
+                RecipeDocument.objects.filter(pk__in=batch).delete()
+                documents.refresh(batch, create=True, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt documents of {len(recipe_ids)} recipes'))
@@ -0,0 +1,29 @@
+from core import stats
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Recompute the per-user recipe statistics from the recipes, '
+            'after writes that bypassed signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='emails',
+                            help='Only rebuild this user (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['emails']:
+            users = dict(get_user_model().objects.filter(
+                email__in=options['emails']).values_list('email', 'id'))
+            missing = set(options['emails']).difference(users)
+            if missing:
+                raise CommandError(
+                    f'No such user: {", ".join(sorted(missing))}')
+            user_ids = list(users.values())
+
+        written = stats.rebuild(user_ids, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt statistics of {written} users'))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold duplicated (user, name) rows into the oldest one"""
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for model_name, relation in [('Tag', 'tags'),
+                                 ('Ingredient', 'ingredients')]:
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        column = f'{model_name.lower()}_id'
+        duplicates = (model.objects.values('user', 'name')
+                      .annotate(total=Count('id'), keep=Min('id'))
+                      .filter(total__gt=1))
+
+        for duplicate in duplicates:
+            stale = (model.objects
+                     .filter(user=duplicate['user'], name=duplicate['name'])
+                     .exclude(id=duplicate['keep']))
+            linked = set(through.objects
+                         .filter(**{f'{column}__in': stale})
+                         .values_list('recipe_id', flat=True))
+            linked -= set(through.objects
+                          .filter(**{column: duplicate['keep']})
+                          .values_list('recipe_id', flat=True))
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{column: duplicate['keep']})
+                for recipe_id in linked])
+            stale.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:35
+
+from bisect import bisect_right
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# As core.stats had them when this migration was written; copied so that
+# later changes there don't change what this migration does.
+TIME_BUCKETS = [15, 30, 60, 120, 240]
+CENTS = Decimal('0.01')
+
+
+def median(prices):
+    """Median of a sorted list of prices"""
+    if not prices:
+        return None
+
+    low, high = prices[(len(prices) - 1) // 2], prices[len(prices) // 2]
+    return ((low + high) / 2).quantize(CENTS, ROUND_HALF_UP)
+
+
+def build_stats(apps, schema_editor):
+    """Summarize the recipes that already exist"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStats = apps.get_model('core', 'RecipeStats')
+
+    rows = (Recipe.objects.order_by('user_id')
+            .values_list('user_id', 'price', 'time_minutes').iterator())
+    for user_id, values in groupby(rows, key=lambda row: row[0]):
+        prices = []
+        histogram = [0] * (len(TIME_BUCKETS) + 1)
+        for _, price, minutes in values:
+            prices.append(Decimal(price).quantize(CENTS))
+            histogram[bisect_right(TIME_BUCKETS, minutes)] += 1
+        prices.sort()
+
+        RecipeStats.objects.create(
+            user_id=user_id,
+            recipe_count=len(prices),
+            price_total=sum(prices),
+            median_price=median(prices),
+            price_counts={f'{price}': count
+                          for price, count in Counter(prices).items()},
+            time_histogram=histogram)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to='core.user')),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('median_price', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('price_counts', models.JSONField(default=dict)),
+                ('time_histogram', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='core.recipe')),
+                ('summary', models.TextField()),
+                ('detail', models.TextField()),
+            ],
+        ),
+    ]
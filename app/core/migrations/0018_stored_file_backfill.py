@@ -0,0 +1,36 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def count_references(apps, schema_editor):
+    """Give the images and variants stored before reference counting a
+    row, so releasing them and collecting orphans treat them like the
+    rest"""
+    Recipe = apps.get_model('core', 'Recipe')
+    StoredFile = apps.get_model('core', 'StoredFile')
+
+    references = Counter()
+    for image, variants in (Recipe.objects.values_list(
+            'image', 'image_variants').iterator()):
+        if image:
+            references[image] += 1
+        for formats in (variants or {}).values():
+            references.update(formats.values())
+
+    counted = set(StoredFile.objects.values_list('name', flat=True))
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name, refcount=refcount)
+         for name, refcount in references.items() if name not in counted],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipe_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
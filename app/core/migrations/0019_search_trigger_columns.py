@@ -0,0 +1,35 @@
+from django.db import migrations
+
+TRIGGER_SQL = '''
+    CREATE TRIGGER core_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE{columns} ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update()
+'''
+DROP_TRIGGER_SQL = (
+    'DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe')
+
+
+def recreate_trigger(columns):
+    """Create the search vector trigger again, firing on updates of
+    `columns` only, or of any column"""
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(DROP_TRIGGER_SQL)
+            schema_editor.execute(TRIGGER_SQL.format(columns=columns))
+
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Stop recomputing the search vector on updates that leave the title
+    and description alone, for databases created with the trigger firing
+    on every update"""
+
+    dependencies = [
+        ('core', '0018_stored_file_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_trigger(' OF title, description'),
+                             recreate_trigger('')),
+    ]
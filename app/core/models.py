@@ -1,19 +1,27 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from core.signals import bulk_created
+from core.stats import stats_values
+from core.storage import ContentAddressedStorage
 import uuid
 import os
 
 
+RECIPE_IMAGE_DIR = os.path.join('uploads', 'recipe')
+
+
 def recipe_image_file_path(instance, filename):
     ext = os.path.splitext(filename)[1]
     filename = f'{uuid.uuid4()}{ext}'
 
-    return os.path.join('uploads', 'recipe', filename)
+    return os.path.join(RECIPE_IMAGE_DIR, filename)
 
 
 class UserManager(BaseUserManager):
@@ -37,6 +45,90 @@ class UserManager(BaseUserManager):
         return user
 
 
+class StoredFileManager(models.Manager):
+
+    def acquire(self, name):
+        """Count a new reference to the file `name`"""
+        if self.filter(name=name).update(refcount=F('refcount') + 1):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name)
+        except IntegrityError:
+            # Created concurrently; count this reference on top.
+            self.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def release(self, name):
+        """Drop a reference to `name` and return how many are left. Files
+        saved before reference counting have no row and count as
+        unshared."""
+        stored = self.select_for_update().filter(name=name).first()
+        if stored is None:
+            return 0
+        if stored.refcount > 1:
+            self.filter(pk=stored.pk).update(refcount=F('refcount') - 1)
+            return stored.refcount - 1
+
+        stored.delete()
+        return 0
+
+
+class RecipeAttributeManager(models.Manager):
+
+    def get_or_create_by_names(self, user, names):
+        """Return a `{name: obj}` map for names, creating the missing ones"""
+        names = set(names)
+        if not names:
+            return {}
+
+        objs = {obj.name: obj
+                for obj in self.filter(user=user, name__in=names)}
+        missing = names.difference(objs)
+
+        if missing:
+            # Rows inserted concurrently by another writer are skipped by the
+            # (user, name) constraint and picked up by the select below.
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True)
+            created = list(self.filter(user=user, name__in=missing))
+            objs.update((obj.name, obj) for obj in created)
+            bulk_created.send(sender=self.model, instances=created)
+
+        return objs
+
+
+class RecipeManager(models.Manager):
+
+    def get_queryset(self):
+        # The search vector is maintained by the database and never needed
+        # in Python, so keep it out of every SELECT.
+        return super().get_queryset().defer('search_vector')
+
+    def reserve_ids(self, count):
+        """Allocate `count` primary keys up front for bulk inserts"""
+        if count <= 0:
+            return []
+
+        connection = connections[self.db]
+        table = self.model._meta.db_table
+        pk_column = self.model._meta.pk.column
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                    'FROM generate_series(1, %s)',
+                    [table, pk_column, count])
+                return [row[0] for row in cursor.fetchall()]
+
+        # PostgreSQL is the only database deployed; SQLite, used by tests,
+        # allows one writer, so continuing after the current maximum is
+        # enough inside the caller's transaction.
+        last_id = self.aggregate(last_id=models.Max('pk'))['last_id'] or 0
+        return list(range(last_id + 1, last_id + count + 1))
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length=255, unique=True)
     name = models.CharField(max_length=255)
@@ -60,11 +152,98 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path,
+                              storage=ContentAddressedStorage())
+    image_variants = models.JSONField(default=dict, blank=True,
+                                      editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'price', 'id'],
+                         name='recipe_user_price_idx'),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         name='recipe_user_time_minutes_idx'),
+            models.Index(fields=['user', 'title', 'id'],
+                         name='recipe_user_title_idx'),
+            models.Index(fields=['user', 'updated_at'],
+                         name='recipe_user_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        # Remember the stored price and time so saving can update the
+        # owner's statistics without reading the row back.
+        if 'price' in recipe.__dict__ and 'time_minutes' in recipe.__dict__:
+            recipe._stats_values = stats_values(recipe)
+
+        return recipe
+
+
+class RecipeDocument(models.Model):
+    """A recipe rendered ahead of time as the list (`summary`) and detail
+    JSON of the API, maintained by recipe.documents"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document')
+
+    summary = models.TextField()
+    detail = models.TextField()
+
+    def __str__(self):
+        return f'Document of recipe {self.recipe_id}'
+
+
+class RecipeStats(models.Model):
+    """Summary of a user's recipes, maintained by core.stats"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recipe_stats')
+
+    recipe_count = models.PositiveIntegerField(default=0)
+    price_total = models.DecimalField(max_digits=12, decimal_places=2,
+                                      default=0)
+    median_price = models.DecimalField(max_digits=5, decimal_places=2,
+                                       null=True)
+    # Recipes per price, `{"5.50": 2}`, which the median is taken from
+    price_counts = models.JSONField(default=dict)
+    # Recipes per core.stats.TIME_BUCKETS bucket of `time_minutes`
+    time_histogram = models.JSONField(default=list)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_count} recipes'
+
+    @property
+    def average_price(self):
+        if not self.recipe_count:
+            return None
+        return self.price_total / self.recipe_count
+
+
+class StoredFile(models.Model):
+    """Reference count of a file in content-addressed storage"""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=1)
+
+    objects = StoredFileManager()
+
+    def __str__(self):
+        return self.name
+
 
 class Tag(models.Model):
     user = models.ForeignKey(
@@ -72,6 +251,23 @@ class Tag(models.Model):
         on_delete=models.CASCADE)
 
     name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Number of recipes linked, maintained by core.receivers
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='unique_tag_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'recipe_count', 'name'],
+                         name='tag_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -83,6 +279,23 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE)
 
     name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Number of recipes linked, maintained by core.receivers
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='unique_ingredient_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'recipe_count', 'name'],
+                         name='ingredient_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,165 @@
+"""
+Receivers keeping denormalized recipe data in step with writes: the
+`updated_at` of recipes whose tags or ingredients change, the
+`recipe_count` of tags and ingredients, the owners' statistics and the
+references to recipe images.
+"""
+from collections import Counter
+from itertools import groupby
+
+from core import stats
+from core.images import release_image
+from core.models import Ingredient, Recipe, Tag
+from core.signals import bulk_created
+from django.db import transaction
+from django.db.models import (Case, Count, F, IntegerField, QuerySet,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+
+def touch_recipes(recipes):
+    """Move `updated_at` of the given recipes (queryset or ids) to now"""
+    if not isinstance(recipes, QuerySet):
+        recipes = Recipe.objects.filter(pk__in=recipes)
+    recipes.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_linked_recipes(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """Recipe representations embed their tags and ingredients, so a link
+    change is a change of the recipe"""
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            touch_recipes([instance.pk])
+    elif action in ['post_add', 'post_remove']:
+        touch_recipes(pk_set)
+    elif action == 'pre_clear':
+        touch_recipes(instance.recipe_set.all())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_of_attribute(sender, instance, created=False, **kwargs):
+    """Renaming or deleting a tag or ingredient changes its recipes"""
+    if not created:
+        touch_recipes(instance.recipe_set.all())
+
+
+def _link_column(through):
+    """Return the through table column pointing at the tag or ingredient
+    side, and that model"""
+    field = next(field for field in through._meta.fields
+                 if field.is_relation and field.name != 'recipe')
+    return field.attname, field.related_model
+
+
+def _change_counts(model, pks, delta):
+    return model.objects.filter(pk__in=pks).update(
+        recipe_count=F('recipe_count') + delta)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep `recipe_count` of tags and ingredients in step with their links.
+    Counters only ever move by relative `F()` updates, so concurrent link
+    changes add up instead of overwriting each other. Links are counted
+    before a removal because `pk_set` holds what was asked to be removed,
+    linked or not.
+    """
+    column, model = _link_column(sender)
+    if not reverse:
+        if action == 'post_add' and pk_set:
+            _change_counts(model, pk_set, 1)
+        elif action in ['pre_remove', 'pre_clear']:
+            links = sender.objects.filter(recipe_id=instance.pk)
+            if action == 'pre_remove':
+                links = links.filter(**{f'{column}__in': pk_set})
+            _change_counts(model, links.values(column), -1)
+        return
+
+    if action == 'post_add' and pk_set:
+        _change_counts(model, [instance.pk], len(pk_set))
+    elif action in ['pre_remove', 'pre_clear']:
+        links = sender.objects.filter(**{column: instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(recipe_id__in=pk_set)
+        linked = links.values(column).annotate(
+            total=Count('pk')).values('total')
+        _change_counts(model, [instance.pk],
+                       -Coalesce(Subquery(linked), 0))
+
+
+@receiver(bulk_created, sender=Recipe.tags.through)
+@receiver(bulk_created, sender=Recipe.ingredients.through)
+def count_links_in_bulk(sender, instances, **kwargs):
+    """Links written with bulk_create or COPY, counted in one update"""
+    column, model = _link_column(sender)
+    counts = Counter(getattr(link, column) for link in instances)
+    if counts:
+        _change_counts(model, counts, Case(
+            *[When(pk=pk, then=Value(delta))
+              for pk, delta in counts.items()],
+            output_field=IntegerField()))
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, **kwargs):
+    """Deleting a recipe drops its links without m2m_changed"""
+    for through in [Recipe.tags.through, Recipe.ingredients.through]:
+        column, model = _link_column(through)
+        _change_counts(model, through.objects.filter(
+            recipe_id=instance.pk).values(column), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def record_recipe_stats(sender, instance, created, **kwargs):
+    """Fold a saved recipe into its owner's statistics"""
+    values = stats.stats_values(instance)
+    stored = getattr(instance, '_stats_values', None)
+    if created:
+        stats.record(instance.user_id, added=[values])
+    elif stored is None:
+        # Saved without having been loaded, so the old values are unknown.
+        stats.rebuild(user_ids=[instance.user_id])
+    elif stored != values:
+        stats.record(instance.user_id, added=[values], removed=[stored])
+    instance._stats_values = values
+
+
+@receiver(post_delete, sender=Recipe)
+def unrecord_recipe_stats(sender, instance, **kwargs):
+    values = getattr(instance, '_stats_values', None)
+    stats.record(instance.user_id,
+                 removed=[values or stats.stats_values(instance)])
+
+
+@receiver(bulk_created, sender=Recipe)
+def record_recipe_stats_in_bulk(sender, instances, **kwargs):
+    def owner(recipe):
+        return recipe.user_id
+
+    for user_id, recipes in groupby(sorted(instances, key=owner), owner):
+        recipes = list(recipes)
+        values = [stats.stats_values(recipe) for recipe in recipes]
+        stats.record(user_id, added=values)
+        for recipe, recipe_values in zip(recipes, values):
+            recipe._stats_values = recipe_values
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """Images are reference counted, so a deleted recipe gives its
+    references back once the delete has committed"""
+    name, variants = instance.image.name, instance.image_variants
+    if name or variants:
+        transaction.on_commit(lambda: release_image(name, variants))
@@ -0,0 +1,83 @@
+"""
+Flat record format shared by recipe exports and imports.
+
+CSV cells hold tag and ingredient names as a JSON list, as names may
+contain any character. Hand-written files may separate them with `|`
+instead.
+"""
+import csv
+import json
+
+from django.db.models import prefetch_related_objects
+
+CSV_FIELDS = ['id', 'title', 'description', 'price', 'time_minutes',
+              'link', 'tags', 'ingredients']
+NAME_SEPARATOR = '|'
+
+
+def iter_recipes(queryset, chunk_size=1000):
+    """
+    Yield recipes from a server-side cursor, prefetching tags and
+    ingredients one chunk at a time so memory stays flat.
+    """
+    chunk = []
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            prefetch_related_objects(chunk, 'tags', 'ingredients')
+            yield from chunk
+            chunk = []
+
+    if chunk:
+        prefetch_related_objects(chunk, 'tags', 'ingredients')
+        yield from chunk
+
+
+def recipe_to_record(recipe):
+    return {
+        'id': recipe.id,
+        'title': recipe.title,
+        'description': recipe.description,
+        'price': str(recipe.price),
+        'time_minutes': recipe.time_minutes,
+        'link': recipe.link,
+        'tags': [tag.name for tag in recipe.tags.all()],
+        'ingredients': [ingredient.name
+                        for ingredient in recipe.ingredients.all()],
+    }
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for record in records:
+        row = dict(record,
+                   tags=json.dumps(record['tags'], ensure_ascii=False),
+                   ingredients=json.dumps(record['ingredients'],
+                                          ensure_ascii=False))
+        yield writer.writerow([row[field] for field in CSV_FIELDS])
+
+
+def split_names(value):
+    """Parse a tag or ingredient list from either record format"""
+    if isinstance(value, str):
+        if value.lstrip().startswith('['):
+            value = json.loads(value)
+        else:
+            value = value.split(NAME_SEPARATOR)
+    if not isinstance(value or [], list):
+        raise TypeError('Names must be a list')
+
+    return [name.strip() for name in value or [] if name.strip()]
@@ -0,0 +1,79 @@
+"""
+JSON rendering through orjson when it is installed.
+
+`FastJSONRenderer` writes the same bytes as DRF's compact `JSONRenderer`
+for the types API payloads hold: strings, integers, lists and dicts are
+encoded by orjson, and everything else (decimals, dates, lazy strings) is
+passed to DRF's encoder. Indented output, as asked for by the browsable
+API, and installs without orjson use `JSONRenderer` itself.
+
+Data that is already JSON text can be wrapped in `RawJSON` to be written
+out as is, and returned in a `RawJSONResponse`.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON(str):
+    """Compact JSON text rendered ahead of time"""
+
+
+class RawJSONResponse(Response):
+    """
+    A response with a body rendered ahead of time. Its `data` is the
+    `RawJSON` while `FastJSONRenderer` renders it, and is parsed for
+    anything else reading it, such as other renderers or the test client.
+    """
+
+    def __init__(self, raw, **kwargs):
+        self.raw = RawJSON(raw)
+        self._rendering = False
+        super().__init__(**kwargs)
+
+    @property
+    def data(self):
+        if self._rendering:
+            return self.raw
+        if self._data is None:
+            self._data = json.loads(self.raw)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def rendered_content(self):
+        self._rendering = isinstance(self.accepted_renderer, FastJSONRenderer)
+        try:
+            return super().rendered_content
+        finally:
+            self._rendering = False
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if isinstance(data, RawJSON):
+            if indent is None and self.compact and not self.ensure_ascii:
+                return data.encode('utf-8')
+            data = json.loads(data)
+        if (orjson is None or data is None or indent is not None
+                or not self.compact or self.ensure_ascii):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        # Like JSONRenderer, escape the line separators JavaScript rejects.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
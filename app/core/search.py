@@ -0,0 +1,95 @@
+"""
+Full-text search over recipe titles and descriptions.
+
+PostgreSQL keeps a weighted `Recipe.search_vector` column up to date with
+a trigger (see migration 0010) and answers queries from a GIN index.
+SQLite has no tsvector, so local setups mirror the two columns into an
+external-content FTS5 table kept in sync by triggers.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import DecimalField, F, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+# ts_rank() returns a float4, which a pagination cursor carries as JSON
+# text and compares back as a double, never quite equal. The rank is
+# rounded to a numeric instead, and the list orders and seeks on that.
+RANK_FIELD = DecimalField(max_digits=12, decimal_places=6)
+SQLITE_FTS_TABLE = 'core_recipe_fts'
+SQLITE_FTS_SQL = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE}
+        USING fts5(title, description,
+                   content='core_recipe', content_rowid='id')''',
+    f'''CREATE TRIGGER IF NOT EXISTS core_recipe_fts_insert
+        AFTER INSERT ON core_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS core_recipe_fts_delete
+        AFTER DELETE ON core_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}
+                ({SQLITE_FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS core_recipe_fts_update
+        AFTER UPDATE OF title, description ON core_recipe BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}
+                ({SQLITE_FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END''',
+    f'''INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE})
+        VALUES ('rebuild')''',
+]
+# bm25() scores are negative, lower is better. The column weights mirror
+# the A (title) and B (description) weights of ts_rank.
+SQLITE_RANK_SQL = (
+    f'SELECT -bm25({SQLITE_FTS_TABLE}, 1.0, 0.4) FROM {SQLITE_FTS_TABLE} '
+    f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = core_recipe.id')
+SQLITE_MATCH_SQL = (
+    f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+    f'WHERE {SQLITE_FTS_TABLE} MATCH %s')
+
+
+def install_sqlite_fts(using='default', **kwargs):
+    """
+    (Re)create the FTS5 mirror and its triggers. SQLite drops triggers
+    whenever a migration rebuilds `core_recipe`, so this also runs on
+    every post_migrate.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'core_recipe'")
+        if cursor.fetchone() is None:
+            return
+        for statement in SQLITE_FTS_SQL:
+            cursor.execute(statement)
+
+
+def search_recipes(queryset, terms):
+    """Filter recipes matching `terms` and annotate them with a `rank`"""
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(terms, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return (queryset.filter(search_vector=query)
+                .annotate(rank=Cast(SearchRank(F('search_vector'), query),
+                                    RANK_FIELD)))
+
+    tokens = re.findall(r'\w+', terms)
+    if not tokens:
+        return queryset.none()
+
+    # bm25() is a double, which JSON round-trips exactly.
+    match = ' '.join(f'"{token}"' for token in tokens)
+    return (queryset.filter(id__in=RawSQL(SQLITE_MATCH_SQL, [match]))
+            .annotate(rank=RawSQL(SQLITE_RANK_SQL, [match],
+                                  output_field=FloatField())))
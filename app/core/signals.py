@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after rows are written with bulk_create or COPY, which bypass
+# post_save and m2m_changed. Receivers get the written `instances`.
+bulk_created = Signal()
@@ -0,0 +1,146 @@
+"""
+Per-user recipe statistics.
+
+Each user has one `RecipeStats` row holding the recipe count, the price
+total, a count of recipes per distinct price and a histogram of
+`time_minutes`. Recipe writes adjust the row incrementally (see
+core.receivers), recomputing the median from the price counts, so reading
+the statistics is a single primary key lookup however many recipes there
+are. `rebuild()` recomputes rows from the recipes themselves, for data
+written with `QuerySet.update()` or raw SQL.
+"""
+from bisect import bisect_right
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+
+from django.db import IntegrityError, transaction
+
+# Upper bounds (exclusive) of the `time_minutes` buckets; the last bucket
+# is open ended
+TIME_BUCKETS = [15, 30, 60, 120, 240]
+CENTS = Decimal('0.01')
+
+
+def stats_values(recipe):
+    """The `(price, time_minutes)` of a recipe the statistics count"""
+    return (Decimal(str(recipe.price)).quantize(CENTS),
+            int(recipe.time_minutes))
+
+
+def time_bucket(minutes):
+    return bisect_right(TIME_BUCKETS, minutes)
+
+
+def median(price_counts):
+    """Median of prices given as `{price: count}`"""
+    total = sum(price_counts.values())
+    if not total:
+        return None
+
+    low, high = (total - 1) // 2, total // 2
+    values = []
+    seen = 0
+    for price in sorted(map(Decimal, price_counts)):
+        seen += price_counts[f'{price}']
+        while len(values) < 2 and seen > (low, high)[len(values)]:
+            values.append(price)
+        if len(values) == 2:
+            break
+
+    return (sum(values) / 2).quantize(CENTS, ROUND_HALF_UP)
+
+
+def apply(stats, values, sign):
+    """Add (`sign` 1) or remove (-1) recipes given as `(price, minutes)`"""
+    histogram = stats.time_histogram + [0] * (
+        len(TIME_BUCKETS) + 1 - len(stats.time_histogram))
+    for price, minutes in values:
+        key = f'{price}'
+        stats.recipe_count += sign
+        stats.price_total += price * sign
+        count = stats.price_counts.get(key, 0) + sign
+        if count > 0:
+            stats.price_counts[key] = count
+        else:
+            stats.price_counts.pop(key, None)
+        histogram[time_bucket(minutes)] += sign
+
+    stats.time_histogram = histogram
+    stats.median_price = median(stats.price_counts)
+
+
+@transaction.atomic(savepoint=False)
+def record(user_id, added=(), removed=()):
+    """
+    Update the user's statistics for recipes added and removed, both given
+    as `stats_values()`. Removals alone never create a row: the user may
+    be on the way out with all of their data.
+    """
+    from core.models import RecipeStats
+
+    stats = RecipeStats.objects.select_for_update().filter(
+        user_id=user_id).first()
+    if stats is None:
+        if not added:
+            return
+        stats = RecipeStats(user_id=user_id, price_counts={},
+                            time_histogram=[])
+        apply(stats, added, 1)
+        try:
+            with transaction.atomic():
+                stats.save(force_insert=True)
+            return
+        except IntegrityError:
+            # Created concurrently; add to that row instead.
+            stats = RecipeStats.objects.select_for_update().get(
+                user_id=user_id)
+
+    apply(stats, added, 1)
+    apply(stats, removed, -1)
+    stats.save()
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Recompute the statistics of the given users, or of everyone, from
+    their recipes in one streaming pass. Returns the number of users
+    written.
+    """
+    from core.models import Recipe, RecipeStats
+
+    recipes = Recipe.objects.order_by('user_id')
+    if user_ids is not None:
+        recipes = recipes.filter(user_id__in=user_ids)
+    rows = recipes.values_list('user_id', 'price', 'time_minutes').iterator(
+        chunk_size=batch_size)
+
+    written = 0
+    batch = []
+    for user_id, values in groupby(rows, key=lambda row: row[0]):
+        stats = RecipeStats(user_id=user_id, price_counts={},
+                            time_histogram=[])
+        apply(stats, ((Decimal(price).quantize(CENTS), minutes)
+                      for _, price, minutes in values), 1)
+        batch.append(stats)
+        if len(batch) >= batch_size:
+            written += _replace(batch)
+            batch = []
+    written += _replace(batch)
+
+    # Users left without recipes.
+    stale = RecipeStats.objects.exclude(user__recipe__isnull=False)
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    stale.delete()
+
+    return written
+
+
+@transaction.atomic
+def _replace(batch):
+    from core.models import RecipeStats
+
+    RecipeStats.objects.filter(
+        user_id__in=[stats.user_id for stats in batch]).delete()
+    RecipeStats.objects.bulk_create(batch)
+    return len(batch)
@@ -0,0 +1,76 @@
+"""
+Content-addressed file storage.
+
+A file is stored under the SHA-256 of its bytes, sharded two levels deep
+(`<dir>/ab/cd/abcd....jpg`) so no directory grows past a few hundred
+entries however many files there are. Saving bytes that are already
+stored only bumps the `StoredFile` reference count and the file's mtime,
+and `delete()` removes the file once the last reference is gone. New
+files are written to a temporary file in the storage root and renamed
+into place, so a reader never sees a partial file.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by content hash"""
+    shard_levels = 2
+    shard_width = 2
+
+    def get_available_name(self, name, max_length=None):
+        # Equal names mean equal content, so a name is never taken.
+        return name
+
+    def _save(self, name, content):
+        from core.models import StoredFile
+
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as tmp_file:
+                content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+
+            name = self.hashed_name(directory, digest.hexdigest(), extension)
+            with transaction.atomic():
+                StoredFile.objects.acquire(name)
+                path = self.path(name)
+                try:
+                    # A dedup hit renews the file's age, so the orphan
+                    # collector doesn't take it for an old orphan.
+                    os.utime(path)
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(tmp, self.file_permissions_mode)
+                    os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        return name
+
+    def hashed_name(self, directory, digest, extension):
+        shards = [digest[level * self.shard_width:
+                         (level + 1) * self.shard_width]
+                  for level in range(self.shard_levels)]
+        return os.path.join(directory, *shards, f'{digest}{extension}')
+
+    def delete(self, name):
+        from core.models import StoredFile
+
+        with transaction.atomic():
+            if StoredFile.objects.release(name) == 0:
+                super().delete(name)
@@ -0,0 +1,24 @@
+import tempfile
+
+from core.checks import check_shared_cache
+from django.test import SimpleTestCase, override_settings
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def test_process_memory_cache_with_one_process(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(SERVER_PROCESSES=4)
+    def test_process_memory_cache_with_several_processes(self):
+        errors = check_shared_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    def test_shared_cache_with_several_processes(self):
+        with tempfile.TemporaryDirectory() as location, \
+                override_settings(SERVER_PROCESSES=4, CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                               'FileBasedCache',
+                    'LOCATION': location}}):
+            self.assertEqual(check_shared_cache(None), [])
@@ -1,8 +1,22 @@
-from django.test import SimpleTestCase
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from core.models import (Ingredient, Recipe, RecipeDocument, RecipeStats,
+                         StoredFile, Tag)
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 from psycopg2 import OperationalError as Psycog2Error
 from unittest.mock import patch
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
+from io import BytesIO, StringIO
+from core import recipe_io
+from core.images import delete_variants, image_storage
+from django.core.files.base import ContentFile
+from PIL import Image
 from django.db.utils import OperationalError
+from core.management.commands.collect_orphan_images import Command
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -21,3 +35,443 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='importer@example.com', password='passtest123')
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as source:
+            source.write(content)
+        return path
+
+    def call(self, path, **options):
+        call_command('import_recipes', path, user=self.user.email,
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import_ndjson(self):
+        Tag.objects.create(user=self.user, name='Dinner')
+        records = [{'title': f'Recipe {i}', 'price': '4.50',
+                    'time_minutes': 10 + i,
+                    'tags': ['Dinner', f'Tag {i % 2}'],
+                    'ingredients': ['Salt']} for i in range(5)]
+        path = self.write_file(
+            'recipes.ndjson', '\n'.join(map(json.dumps, records)))
+
+        self.call(path, batch_size=2)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(recipes[0].price, Decimal('4.50'))
+        self.assertEqual(recipes[4].time_minutes, 14)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(recipes[3].tags.count(), 2)
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_import_csv_skips_invalid_rows(self):
+        path = self.write_file('recipes.csv', (
+            'title,price,time_minutes,tags,ingredients\n'
+            'Soup,3.00,20,Dinner| Warm,Water|Salt\n'
+            'Broken,not-a-price,20,,\n'
+            'Salad,2.00,5,,Lettuce\n'))
+
+        self.call(path)
+
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Dinner', 'Warm'])
+        self.assertEqual(soup.ingredients.count(), 2)
+        self.assertTrue(Recipe.objects.filter(title='Salad').exists())
+        self.assertFalse(Recipe.objects.filter(title='Broken').exists())
+
+    def test_import_csv_round_trips_export(self):
+        names = {'tags': ['Fish | Chips', 'Say "hi", [x]'],
+                 'ingredients': ['Salt|Pepper']}
+        path = self.write_file('recipes.csv', ''.join(recipe_io.csv_lines(
+            [dict(names, id=1, title='Soup', description='', price='3.00',
+                  time_minutes=20, link='')])))
+
+        self.call(path)
+
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(sorted(soup.tags.values_list('name', flat=True)),
+                         sorted(names['tags']))
+        self.assertEqual(
+            list(soup.ingredients.values_list('name', flat=True)),
+            names['ingredients'])
+
+    def test_import_skips_records_with_long_names(self):
+        records = [{'title': 'Soup', 'price': '3.00', 'time_minutes': 20,
+                    'tags': ['x' * 256]},
+                   {'title': 'Salad', 'price': '2.00', 'time_minutes': 5,
+                    'ingredients': ['Lettuce']}]
+        path = self.write_file(
+            'recipes.ndjson', '\n'.join(map(json.dumps, records)))
+        stderr = StringIO()
+
+        call_command('import_recipes', path, user=self.user.email,
+                     stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)),
+                         ['Salad'])
+        self.assertFalse(Tag.objects.exists())
+        self.assertIn('Record 1 skipped', stderr.getvalue())
+
+    def test_import_ndjson_skips_malformed_lines(self):
+        path = self.write_file('recipes.ndjson', (
+            '{"title": "Soup", "price": "3.00", "time_minutes": 20}\n'
+            '{"title": "Broken", "price":\n'
+            '\n'
+            '{"title": "Salad", "price": "2.00", "time_minutes": 5}\n'))
+        stderr = StringIO()
+
+        call_command('import_recipes', path, user=self.user.email,
+                     stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Salad', 'Soup'])
+        self.assertIn('Record 2 skipped', stderr.getvalue())
+
+    def test_import_resumes_from_checkpoint(self):
+        records = [{'title': f'Recipe {i}', 'price': '1.00',
+                    'time_minutes': 5} for i in range(4)]
+        path = self.write_file(
+            'recipes.ndjson', '\n'.join(map(json.dumps, records)))
+        with open(f'{path}.checkpoint', 'w') as checkpoint:
+            json.dump({'source': path, 'records': 3}, checkpoint)
+
+        self.call(path, resume=True)
+
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)),
+            ['Recipe 3'])
+
+
+class BenchmarkLoginsCommandTests(SimpleTestCase):
+
+    def test_reports_each_pool_size(self):
+        out = StringIO()
+        with self.settings(PASSWORD_HASHER_TIERS={'standard': 1000}):
+            call_command('benchmark_logins', pool_sizes='0,1', logins=4,
+                         concurrency=2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('workers=0', output)
+        self.assertIn('workers=1', output)
+        self.assertIn('0 shed', output)
+
+
+class BenchmarkRecipeListCommandTests(TestCase):
+
+    def test_compares_both_paths(self):
+        user = get_user_model().objects.create_user(
+            email='bench@example.com', password='passtest123')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=10,
+                price=Decimal('4.50'))
+            recipe.tags.add(Tag.objects.create(user=user, name=f'Tag {i}'))
+
+        outputs = {}
+        for endpoint in ['recipes', 'tags']:
+            out = StringIO()
+            call_command('benchmark_recipe_list', user.email,
+                         endpoint=endpoint, requests=2, stdout=out)
+
+            outputs[endpoint] = output = out.getvalue()
+            self.assertIn('serializer', output)
+            self.assertIn('values', output)
+            self.assertIn('Bodies are identical', output)
+        self.assertIn('documents', outputs['recipes'])
+        self.assertNotIn('documents', outputs['tags'])
+
+
+class GenerateImageVariantsCommandTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200)).save(buffer, format='JPEG')
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', price=Decimal('5.00'), time_minutes=10)
+        self.recipe.image.save('soup.jpg', ContentFile(buffer.getvalue()))
+        self.broken = Recipe.objects.create(
+            user=user, title='Broken', price=Decimal('5.00'),
+            time_minutes=10)
+        self.broken.image.save('broken.jpg', ContentFile(b'not an image'))
+
+    def tearDown(self):
+        for recipe in Recipe.objects.all():
+            delete_variants(recipe.image_variants)
+            recipe.image.delete()
+
+    def test_backfills_missing_variants(self):
+        for workers in [0, 2]:
+            Recipe.objects.update(image_variants={})
+            out, err = StringIO(), StringIO()
+            call_command('generate_image_variants', workers=workers,
+                         stdout=out, stderr=err)
+
+            self.recipe.refresh_from_db()
+            self.assertEqual(
+                set(self.recipe.image_variants['medium']), {'jpeg', 'webp'})
+            self.assertIn('for 1 images, 1 failed', out.getvalue())
+            self.assertIn(f'Recipe {self.broken.id}', err.getvalue())
+
+    def test_skips_recipes_with_variants(self):
+        call_command('generate_image_variants', workers=0, stdout=StringIO(),
+                     stderr=StringIO())
+        out = StringIO()
+
+        call_command('generate_image_variants', workers=0, stdout=out,
+                     stderr=StringIO())
+
+        self.assertIn('for 0 images, 1 failed', out.getvalue())
+
+
+class CollectOrphanImagesCommandTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media = media.name
+
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', price=Decimal('5.00'), time_minutes=10)
+        self.recipe.image.save('soup.jpg', ContentFile(b'soup'))
+        self.referenced = self.recipe.image.name
+
+        self.orphans = [self.write('uploads/recipe/a-old.jpg'),
+                        self.write('uploads/recipe/variants/x/thumb.jpg'),
+                        self.write('uploads/recipe/z-old.jpg')]
+        self.young = self.write('uploads/recipe/young.jpg', age=0)
+        self.make_old(self.referenced)
+
+    def write(self, name, age=7200):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as image_file:
+            image_file.write(b'data')
+        self.make_old(name, age)
+        return name
+
+    def make_old(self, name, age=7200):
+        stamp = time.time() - age
+        os.utime(os.path.join(self.media, name), (stamp, stamp))
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media, name))
+
+    def call(self, **options):
+        out = StringIO()
+        call_command('collect_orphan_images', max_rate=0, batch_size=2,
+                     stdout=out, **options)
+        return out.getvalue()
+
+    def test_deletes_only_old_unreferenced_files(self):
+        output = self.call()
+
+        for name in self.orphans:
+            self.assertFalse(self.exists(name))
+        self.assertTrue(self.exists(self.young))
+        self.assertTrue(self.exists(self.referenced))
+        self.assertIn('Examined 5 files, deleted 3 (12 bytes)', output)
+        self.assertFalse(self.exists('.collect_orphan_images.json'))
+
+    def test_keeps_referenced_variants(self):
+        StoredFile.objects.create(name=self.orphans[1])
+
+        output = self.call()
+
+        self.assertTrue(self.exists(self.orphans[1]))
+        self.assertIn('deleted 2', output)
+
+    def test_keeps_orphans_stored_again_during_the_run(self):
+        storage = image_storage()
+        name = storage.save('uploads/recipe/pie.jpg', ContentFile(b'pie'))
+        StoredFile.objects.filter(name=name).delete()
+        self.make_old(name)
+        orphans = Command._orphans
+
+        def store_again(command, batch, cutoff):
+            for orphan in orphans(command, batch, cutoff):
+                if orphan[0] == name:
+                    # Deduplicated against the file about to be deleted.
+                    storage.save('uploads/recipe/pie.jpg',
+                                 ContentFile(b'pie'))
+                yield orphan
+
+        with patch.object(Command, '_orphans', store_again):
+            output = self.call()
+
+        self.assertTrue(self.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+        self.assertIn('deleted 3', output)
+        self.assertFalse(StoredFile.objects.filter(refcount=0).exists())
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.call(dry_run=True)
+
+        for name in self.orphans:
+            self.assertTrue(self.exists(name))
+        self.assertIn('would delete 3', output)
+
+    def checkpoint(self, directory, name):
+        with open(os.path.join(self.media, '.collect_orphan_images.json'),
+                  'w') as checkpoint:
+            json.dump({'location': os.path.abspath(self.media),
+                       'position': [directory, name]}, checkpoint)
+
+    def test_resumes_after_checkpoint(self):
+        self.checkpoint('uploads/recipe/variants/x', 'thumb.jpg')
+
+        output = self.call()
+
+        self.assertTrue(self.exists(self.orphans[0]))
+        self.assertTrue(self.exists(self.orphans[1]))
+        self.assertTrue(self.exists(self.orphans[2]))
+        self.assertIn('Examined 0 files', output)
+
+    def test_resumes_in_listing_order(self):
+        root = os.path.join(self.media, 'uploads', 'recipe')
+        listed = [entry.name for entry in os.scandir(root)
+                  if entry.is_file()]
+        remaining = listed[listed.index('young.jpg') + 1:]
+        self.checkpoint('uploads/recipe', 'young.jpg')
+
+        output = self.call()
+
+        for name in ['a-old.jpg', 'z-old.jpg']:
+            self.assertEqual(self.exists(f'uploads/recipe/{name}'),
+                             name not in remaining)
+        self.assertFalse(self.exists(self.orphans[1]))
+        self.assertIn(f'Examined {len(remaining) + 2} files', output)
+
+    def test_restarts_directory_when_checkpoint_file_is_gone(self):
+        self.checkpoint('uploads/recipe', 'gone.jpg')
+
+        output = self.call()
+
+        for name in self.orphans:
+            self.assertFalse(self.exists(name))
+        self.assertIn('Examined 5 files', output)
+
+    def test_interrupted_run_resumes_where_it_stopped(self):
+        written = []
+        write = Command._write_checkpoint
+
+        def stop_after_first(command, checkpoint, position):
+            write(command, checkpoint, position)
+            written.append(position)
+            raise KeyboardInterrupt
+
+        with patch.object(Command, '_write_checkpoint', stop_after_first):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call()
+        output = self.call()
+
+        for name in self.orphans:
+            self.assertFalse(self.exists(name))
+        self.assertTrue(self.exists(self.young))
+        self.assertTrue(self.exists(self.referenced))
+        self.assertIn(f'Resuming in {written[0][0]}', output)
+        self.assertIn('Examined 3 files', output)
+
+
+class RebuildRecipeStatsCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='stats@example.com', password='passtest123')
+
+    def test_rebuild_after_bypassing_writes(self):
+        for price in ['2.00', '4.00', '9.00']:
+            Recipe.objects.create(user=self.user, title='Soup',
+                                  time_minutes=20, price=Decimal(price))
+        Recipe.objects.filter(user=self.user).update(
+            price=Decimal('1.00'), time_minutes=5)
+
+        call_command('rebuild_recipe_stats', user=[self.user.email],
+                     stdout=StringIO())
+
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 3)
+        self.assertEqual(stats.price_total, Decimal('3.00'))
+        self.assertEqual(stats.median_price, Decimal('1.00'))
+        self.assertEqual(stats.time_histogram, [3, 0, 0, 0, 0, 0])
+
+    def test_rebuild_drops_users_without_recipes(self):
+        Recipe.objects.create(user=self.user, title='Soup',
+                              time_minutes=20, price=Decimal('2.00'))
+        Recipe.objects.filter(user=self.user).delete()
+        RecipeStats.objects.update_or_create(
+            user=self.user, defaults={'recipe_count': 7})
+
+        call_command('rebuild_recipe_stats', stdout=StringIO())
+
+        self.assertFalse(RecipeStats.objects.filter(user=self.user).exists())
+
+
+class RebuildRecipeDocumentsCommandTests(TestCase):
+
+    def test_rebuilds_stale_and_missing_documents(self):
+        user = get_user_model().objects.create_user(
+            email='docs@example.com', password='passtest123')
+        recipes = [Recipe.objects.create(
+            user=user, title=f'Recipe {i}', time_minutes=10,
+            price=Decimal('4.50')) for i in range(3)]
+        # Writes bypassing signals leave documents stale or missing.
+        Recipe.objects.filter(pk=recipes[0].pk).update(title='Renamed')
+        RecipeDocument.objects.filter(pk=recipes[1].pk).delete()
+
+        out = StringIO()
+        call_command('rebuild_recipe_documents', stdout=out)
+
+        self.assertIn('Rebuilt documents of 3 recipes', out.getvalue())
+        self.assertEqual(RecipeDocument.objects.count(), 3)
+        self.assertEqual(
+            json.loads(RecipeDocument.objects.get(pk=recipes[0].pk)
+                       .summary)['title'], 'Renamed')
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_documents',
+                         user=['nobody@example.com'])
+
+
+class BenchmarkAsyncViewsCommandTests(TransactionTestCase):
+
+    def test_compares_wsgi_and_asgi(self):
+        user = get_user_model().objects.create_user(
+            email='bench@example.com', password='passtest123')
+        for i in range(3):
+            Recipe.objects.create(user=user, title=f'Recipe {i}',
+                                  time_minutes=10, price=Decimal('4.50'))
+
+        for endpoint in ['list', 'detail']:
+            out = StringIO()
+            call_command('benchmark_async_views', user.email,
+                         endpoint=endpoint, requests=4, concurrency=2,
+                         threads=2, db_latency=1, stdout=out)
+
+            output = out.getvalue()
+            self.assertIn('wsgi', output)
+            self.assertIn('asgi', output)
+            self.assertIn('Bodies are identical', output)
@@ -1,8 +1,10 @@
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from decimal import Decimal
 from core import models
+from core.signals import bulk_created
 from unittest.mock import patch
 
 
@@ -61,6 +63,35 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Sauce')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Tag.objects.create(user=user, name='Sauce')
+
+    def test_get_or_create_by_names(self):
+        user = create_user()
+        existing = models.Ingredient.objects.create(user=user, name='Salt')
+
+        objs = models.Ingredient.objects.get_or_create_by_names(
+            user, ['Salt', 'Pepper', 'Pepper'])
+
+        self.assertEqual(set(objs), {'Salt', 'Pepper'})
+        self.assertEqual(objs['Salt'], existing)
+        self.assertEqual(
+            models.Ingredient.objects.filter(user=user).count(), 2)
+
+    def test_reserved_ids_skip_rows_inserted_directly(self):
+        user = create_user()
+        reserved = models.Recipe.objects.reserve_ids(1)
+        models.Recipe.objects.create(
+            id=reserved[0] + 10, user=user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'))
+
+        self.assertEqual(models.Recipe.objects.reserve_ids(1),
+                         [reserved[0] + 11])
+
     def test_create_ingredient(self):
         user = create_user()
         ingredient = models.Ingredient.objects.create(
@@ -76,3 +107,70 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class RecipeCountTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.recipe = self.create_recipe()
+        self.vegan = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = models.Tag.objects.create(user=self.user, name='Quick')
+
+    def create_recipe(self):
+        return models.Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('5.50'))
+
+    def assertCounts(self, vegan, quick):
+        self.vegan.refresh_from_db()
+        self.quick.refresh_from_db()
+        self.assertEqual(
+            (self.vegan.recipe_count, self.quick.recipe_count),
+            (vegan, quick))
+
+    def test_add_and_remove_links(self):
+        self.recipe.tags.add(self.vegan, self.quick)
+        self.recipe.tags.add(self.vegan)
+        self.assertCounts(1, 1)
+
+        self.recipe.tags.remove(self.vegan)
+        self.recipe.tags.remove(self.vegan)
+        self.assertCounts(0, 1)
+
+        self.recipe.tags.set([self.vegan])
+        self.assertCounts(1, 0)
+
+        self.recipe.tags.clear()
+        self.assertCounts(0, 0)
+
+    def test_links_changed_from_the_tag(self):
+        other = self.create_recipe()
+        self.vegan.recipe_set.add(self.recipe, other)
+        self.assertCounts(2, 0)
+
+        self.vegan.recipe_set.remove(other, other)
+        self.assertCounts(1, 0)
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_recipe_deletion(self):
+        self.recipe.tags.add(self.vegan, self.quick)
+        other = self.create_recipe()
+        other.tags.add(self.vegan)
+
+        self.recipe.delete()
+
+        self.assertCounts(1, 0)
+
+    def test_bulk_created_links(self):
+        through = models.Recipe.tags.through
+        recipes = [self.recipe, self.create_recipe(), self.create_recipe()]
+        links = [through(recipe_id=recipe.id, tag_id=self.vegan.id)
+                 for recipe in recipes]
+        links.append(through(recipe_id=self.recipe.id, tag_id=self.quick.id))
+        through.objects.bulk_create(links)
+
+        bulk_created.send(sender=through, instances=links)
+
+        self.assertCounts(3, 1)
@@ -0,0 +1,37 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from core import renderers
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+PAYLOAD = {
+    'results': [{'id': 1, 'title': 'Crème brûlée \u2028\u2029 "quoted"',
+                 'price': Decimal('5.50'), 'link': '', 'tags': [],
+                 'image_variants': None, 'ratio': 1.5}],
+    'next': None,
+    'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456,
+                                    tzinfo=datetime.timezone.utc),
+    7: True,
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(PAYLOAD),
+                         JSONRenderer().render(PAYLOAD))
+
+    def test_indented_output_falls_back(self):
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type))
+
+    def test_without_orjson(self):
+        with patch.object(renderers, 'orjson', None):
+            rendered = renderers.FastJSONRenderer().render(PAYLOAD)
+
+        self.assertEqual(rendered, JSONRenderer().render(PAYLOAD))
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+        self.addCleanup(self.location.cleanup)
+        self.storage = ContentAddressedStorage(location=self.location.name)
+
+    def test_names_files_by_content_hash(self):
+        name = self.storage.save('uploads/recipe/photo.JPG',
+                                 ContentFile(b'content'))
+
+        digest = ('ed7002b439e9ac845f22357d822bac14'
+                  '44730fbdb6016d3ec9432297b9ec9f73')
+        self.assertEqual(
+            name, f'uploads/recipe/ed/70/{digest}.jpg')
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'content')
+
+    def test_identical_content_stored_once(self):
+        first = self.storage.save('a/one.png', ContentFile(b'same'))
+        second = self.storage.save('a/two.png', ContentFile(b'same'))
+
+        self.assertEqual(first, second)
+        self.assertEqual(StoredFile.objects.get(name=first).refcount, 2)
+
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.assertEqual(StoredFile.objects.get(name=first).refcount, 1)
+
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertFalse(StoredFile.objects.filter(name=first).exists())
+
+    def test_no_temporary_files_left(self):
+        self.storage.save('a/one.png', ContentFile(b'one'))
+        self.storage.save('a/two.png', ContentFile(b'one'))
+
+        leftovers = [name for _, _, files in os.walk(self.location.name)
+                     for name in files if name.endswith('.tmp')]
+        self.assertEqual(leftovers, [])
+
+    def test_untracked_file_deleted(self):
+        path = os.path.join(self.location.name, 'legacy.jpg')
+        with open(path, 'wb') as legacy:
+            legacy.write(b'old')
+
+        self.storage.delete('legacy.jpg')
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_identical_content_renews_mtime(self):
+        name = self.storage.save('a/one.png', ContentFile(b'same'))
+        path = self.storage.path(name)
+        os.utime(path, (0, 0))
+
+        self.storage.save('a/two.png', ContentFile(b'same'))
+
+        self.assertGreater(os.stat(path).st_mtime, 0)
@@ -0,0 +1,30 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, num, connection):
+        self.test_case = test_case
+        self.num = num
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+
+        executed = len(self)
+        queries = '\n'.join(
+            f'{i}. {query["sql"]}'
+            for i, query in enumerate(self.captured_queries, start=1))
+        self.test_case.assertLessEqual(
+            executed, self.num,
+            f'{executed} queries executed, at most {self.num} expected.'
+            f'\nCaptured queries were:\n{queries}')
+
+
+class QueryBudgetMixin:
+    """Assert a block of code stays within a fixed query budget"""
+
+    def assertMaxQueries(self, num, using=DEFAULT_DB_ALIAS):
+        return _AssertMaxQueriesContext(self, num, connections[using])
@@ -0,0 +1,60 @@
+"""
+Per-user version counters kept in the shared cache.
+
+A version only ever moves forward: a missing key (never set or evicted)
+is reseeded from the clock rather than restarted, so a value that was
+current once is never handed out again and anything keyed by it can be
+trusted until the next bump.
+
+A bump only reaches the processes sharing the cache, so anything trusting
+a version must be served by processes sharing one: see `is_shared()`.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def is_shared():
+    """Whether a bump reaches every process serving the app: the default
+    cache isn't kept in process memory, or there is only one process"""
+    return (settings.SERVER_PROCESSES <= 1 or
+            not isinstance(caches['default'], LocMemCache))
+
+
+def _key(namespace, user_id):
+    return f'version:{namespace}:{user_id}'
+
+
+def get_version(namespace, user_id):
+    key = _key(namespace, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_version(namespace, user_id):
+    key = _key(namespace, user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def invalidate(namespace, user_id):
+    """
+    Bump a version for a write made in the current transaction.
+
+    The immediate bump covers reads inside the transaction; the second one,
+    after commit, retires anything a concurrent reader cached from the
+    pre-commit snapshot in between.
+    """
+    bump_version(namespace, user_id)
+    transaction.on_commit(lambda: bump_version(namespace, user_id))
@@ -0,0 +1,19 @@
+"""
+URL mappings for the recipe app under ASGI: the async views of
+recipe.async_views take the list, detail and image upload URLs, and the
+rest is routed like recipe.urls.
+"""
+from django.urls import include, path, re_path
+from recipe import async_views
+from recipe.urls import router
+
+app_name = 'recipe'
+
+urlpatterns = [
+    re_path(r'^recipes/$', async_views.list_view, name='recipe-list'),
+    re_path(r'^recipes/(?P<pk>[^/.]+)/$', async_views.detail_view,
+            name='recipe-detail'),
+    re_path(r'^recipes/(?P<pk>[^/.]+)/upload-image/$',
+            async_views.upload_image_view, name='recipe-upload-image'),
+    path('', include(router.urls)),
+]
@@ -0,0 +1,206 @@
+"""
+Async request path for recipes under ASGI.
+
+A sync view served over ASGI holds a thread for the whole request, so
+each request in flight costs a thread and its stack. The views here are
+coroutines instead. They run blocking steps in small pools and hold no
+thread while they wait:
+
+- `run_orm()` runs ORM work on `ASYNC_ORM_THREADS` threads.
+- `run_file()` runs file I/O on `ASYNC_FILE_THREADS` threads, so a slow
+  disk can't starve the ORM pool. Saving and deleting images also
+  counts references in `StoredFile`, so these threads query too.
+
+Both pools manage connections as a request would, so the process opens
+at most one database connection per thread of either pool: ORM plus
+file threads. Each is kept for as long as CONN_MAX_AGE allows.
+
+List and detail delegate the viewset's own pipeline to the ORM pool:
+authentication, conditional GET, the response cache and the stored
+documents. Image uploads parse the form, validate and write the file on
+the file pool, and only update the row on the ORM pool. Other methods on
+these URLs go to the viewset in the ORM pool.
+
+With `0` threads, work goes through Django's thread-sensitive
+`sync_to_async` instead. It shares the request's thread and database
+connection, which tests need to see their own transaction.
+
+`app.asgi` serves `app.asgi_urls`, which routes to these views.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from core.models import Recipe
+from django.conf import settings
+from django.db import close_old_connections
+from recipe.uploads import BoundedTemporaryFileUploadHandler
+from recipe.views import RecipesViewSet
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, workers):
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f'async-{name}')
+
+        return _executors[name]
+
+
+def shutdown_executors():
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
+
+
+def _with_connection(func):
+    """Run `func` the way a request would, closing connections that are
+    broken or past CONN_MAX_AGE before and after"""
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return wrapper
+
+
+async def run_orm(func, *args, **kwargs):
+    """Run database work on the bounded ORM pool"""
+    workers = settings.ASYNC_ORM_THREADS
+    if not workers:
+        return await sync_to_async(func)(*args, **kwargs)
+
+    return await sync_to_async(
+        _with_connection(func), thread_sensitive=False,
+        executor=get_executor('orm', workers))(*args, **kwargs)
+
+
+async def run_file(func, *args, **kwargs):
+    """Run file I/O, and the storage's reference counting, on the
+    bounded file pool"""
+    workers = settings.ASYNC_FILE_THREADS
+    if not workers:
+        return await sync_to_async(func)(*args, **kwargs)
+
+    return await sync_to_async(
+        _with_connection(func), thread_sensitive=False,
+        executor=get_executor('file', workers))(*args, **kwargs)
+
+
+def _rendered(view):
+    """An async view running the sync `view` on the ORM pool; the
+    response is rendered there too, as the browsable API may query"""
+    def call(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def async_view(request, *args, **kwargs):
+        return await run_orm(call, request, *args, **kwargs)
+
+    return async_view
+
+
+list_view = _rendered(RecipesViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipe', detail=False))
+detail_view = _rendered(RecipesViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'}, basename='recipe', detail=True))
+
+
+class ImageUpload:
+    """The `upload_image` action of `RecipesViewSet`, with each step on
+    the pool matching its kind of I/O"""
+
+    def __init__(self, request, pk):
+        self.view = RecipesViewSet(
+            action='upload_image', action_map={'post': 'upload_image'},
+            basename='recipe', detail=True)
+        self.view.setup(request, pk=pk)
+        self.request = self.view.initialize_request(request, pk=pk)
+        self.view.request = self.request
+        self.view.headers = self.view.default_response_headers
+        self.handler = BoundedTemporaryFileUploadHandler()
+        self.request.upload_handlers = [self.handler]
+
+    def get_recipe(self):
+        """Authenticate, check permissions and load the recipe"""
+        self.view.initial(self.request)
+        return self.view.get_object()
+
+    def validate(self, recipe):
+        """Parse the upload into a temporary file and validate it"""
+        data = self.request.data
+        if 'image' in self.handler.rejected:
+            raise ValidationError({'image': [
+                f'Ensure the image is at most {self.handler.max_bytes} '
+                f'bytes.']})
+
+        serializer = self.view.get_serializer(recipe, data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def store(self, recipe, image):
+        """Write the image where the model would, returning its name"""
+        field = Recipe._meta.get_field('image')
+        name = field.generate_filename(recipe, image.name)
+        return field.storage.save(name, image, max_length=field.max_length)
+
+    def save(self, serializer, name):
+        """Point the recipe at the stored image and render the result"""
+        serializer.save(image=name)
+        return serializer.data
+
+    def finalize(self, response):
+        response = self.view.finalize_response(
+            self.request, response, *self.view.args, **self.view.kwargs)
+        response.render()
+        return response
+
+    def fail(self, exc):
+        return self.finalize(self.view.handle_exception(exc))
+
+    async def __call__(self):
+        try:
+            recipe = await run_orm(self.get_recipe)
+            serializer = await run_file(self.validate, recipe)
+            name = await run_file(
+                self.store, recipe, serializer.validated_data['image'])
+            try:
+                data = await run_orm(self.save, serializer, name)
+            except Exception:
+                await run_file(Recipe._meta.get_field('image').storage.delete,
+                               name)
+                raise
+        except Exception as exc:
+            return await run_orm(self.fail, exc)
+
+        return await run_orm(
+            self.finalize, Response(data, status=status.HTTP_200_OK))
+
+
+upload_image_fallback = _rendered(RecipesViewSet.as_view(
+    {'post': 'upload_image'}, basename='recipe', detail=True))
+
+
+async def upload_image_view(request, pk):
+    if request.method != 'POST':
+        # Answered by the viewset, with a 405.
+        return await upload_image_fallback(request, pk=pk)
+
+    return await ImageUpload(request, pk)()
+
+
+list_view.csrf_exempt = True
+detail_view.csrf_exempt = True
+upload_image_view.csrf_exempt = True
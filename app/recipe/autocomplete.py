@@ -0,0 +1,103 @@
+"""
+Type-ahead over a user's tag and ingredient names.
+
+Each process keeps a small LRU of per-user `PrefixIndex` objects, sorted
+arrays of case-folded names searched with bisect. An index is tagged with
+the user's `autocomplete` version and rebuilt when a write bumps it.
+"""
+import difflib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from core.versions import get_version
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def version_namespace(model):
+    return f'autocomplete:{model._meta.label_lower}'
+
+
+class PrefixIndex:
+    """Sorted `(folded name, id, name)` rows of one user"""
+
+    def __init__(self, rows):
+        entries = sorted((name.casefold(), pk, name) for pk, name in rows)
+        self.keys = [key for key, pk, name in entries]
+        self.items = [{'id': pk, 'name': name} for key, pk, name in entries]
+
+    def prefix(self, term, limit):
+        term = term.casefold()
+        matches = []
+        position = bisect_left(self.keys, term)
+        while (position < len(self.keys) and len(matches) < limit and
+               self.keys[position].startswith(term)):
+            matches.append(self.items[position])
+            position += 1
+
+        return matches
+
+    def fuzzy(self, term, limit, exclude=()):
+        close = difflib.get_close_matches(
+            term.casefold(), self.keys, n=limit + len(exclude), cutoff=0.6)
+        matches = []
+        for key in dict.fromkeys(close):
+            position = bisect_left(self.keys, key)
+            while (position < len(self.keys) and
+                   self.keys[position] == key):
+                if self.items[position]['id'] not in exclude:
+                    matches.append(self.items[position])
+                position += 1
+
+        return matches[:limit]
+
+
+def get_index(queryset, user):
+    """Return the user's index for the queryset's model, rebuilding it when
+    it is missing or older than the user's current version"""
+    model = queryset.model
+    cache_key = (model._meta.label_lower, user.id)
+    version = get_version(version_namespace(model), user.id)
+
+    with _lock:
+        cached = _indexes.get(cache_key)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(cache_key)
+            return cached[1]
+
+    index = PrefixIndex(
+        queryset.filter(user=user).values_list('id', 'name').iterator())
+
+    with _lock:
+        _indexes[cache_key] = (version, index)
+        _indexes.move_to_end(cache_key)
+        while len(_indexes) > settings.AUTOCOMPLETE_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def suggest(queryset, user, term, limit):
+    """Prefix matches first, then typo-tolerant ones up to `limit`"""
+    index = get_index(queryset, user)
+    matches = index.prefix(term, limit)
+    if len(matches) >= limit:
+        return matches
+
+    exclude = {item['id'] for item in matches}
+    remaining = limit - len(matches)
+    if connections[queryset.db].vendor == 'postgresql':
+        # name % term is answered from the trigram GIN index.
+        similar = (queryset.filter(user=user, name__trigram_similar=term)
+                   .exclude(id__in=exclude)
+                   .annotate(similarity=TrigramSimilarity('name', term))
+                   .order_by('-similarity', 'name')
+                   .values('id', 'name')[:remaining])
+        return matches + list(similar)
+
+    return matches + index.fuzzy(term, remaining, exclude)
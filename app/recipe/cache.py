@@ -0,0 +1,72 @@
+"""
+Response cache for list endpoints.
+
+Entries are keyed by user, by the user's `data` version and by the full
+request URL. Every write to a user's recipes, tags, ingredients or their
+links bumps that version (see recipe.signals), which retires all of the
+user's entries at once without looking them up.
+"""
+import hashlib
+
+from core.renderers import RawJSON, RawJSONResponse
+from core.versions import get_version
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+DATA_NAMESPACE = 'data'
+STATS_KEYS = {'hits': 'response-cache:hits',
+              'misses': 'response-cache:misses'}
+
+
+def _count(counter):
+    key = STATS_KEYS[counter]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats():
+    """Hit and miss counters shared by every process using the cache"""
+    return {counter: cache.get(key, 0) for counter, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+class CachedListMixin:
+    """Serve `list` from the cache until the user's data changes"""
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _count('hits')
+            response = self.get_cached_list_response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            # Documents are cached as the JSON text they were served as.
+            data = getattr(response, 'raw', None)
+            if data is None:
+                data = response.data
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get_cached_list_response(self, data):
+        if isinstance(data, RawJSON):
+            return RawJSONResponse(data)
+        return Response(data)
+
+    def get_list_cache_key(self, request):
+        version = get_version(DATA_NAMESPACE, request.user.id)
+        url = hashlib.md5(
+            request.build_absolute_uri().encode('utf-8')).hexdigest()
+        return f'response:{request.user.id}:{version}:{self.basename}:{url}'
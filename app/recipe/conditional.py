@@ -0,0 +1,120 @@
+"""
+Conditional GET support.
+
+A request carrying a matching If-None-Match or If-Modified-Since gets
+its 304 before the queryset is evaluated or anything is serialized.
+
+List ETags are derived from the user's data version, which every write
+bumps, so they cost no query at all. Last-Modified is the newest
+`updated_at` (one aggregate, cached under that version) or the last
+deletion, whichever is later, since a delete leaves no row to carry its
+timestamp.
+"""
+import hashlib
+from calendar import timegm
+
+from core.versions import get_version
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from recipe.cache import DATA_NAMESPACE
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(
+        '|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+def to_timestamp(value):
+    return timegm(value.utctimetuple()) if value else None
+
+
+def _deleted_key(user_id):
+    return f'deleted-at:{user_id}'
+
+
+def mark_deleted(user_id):
+    cache.set(_deleted_key(user_id), timezone.now(), timeout=None)
+
+
+def get_deleted_at(user_id):
+    """
+    Time of the user's last delete. A missing key may have been evicted,
+    so it is reseeded with the current time rather than assumed never.
+    """
+    key = _deleted_key(user_id)
+    deleted_at = cache.get(key)
+    if deleted_at is None:
+        cache.add(key, timezone.now(), timeout=None)
+        deleted_at = cache.get(key)
+
+    return deleted_at
+
+
+class ConditionalGetMixin:
+    """Strong ETag and Last-Modified validators for `list` and `retrieve`"""
+
+    def get_validator_queryset(self):
+        return self.queryset.model.objects.filter(user=self.request.user)
+
+    def get_list_validators(self, request):
+        user_id = request.user.id
+        version = get_version(DATA_NAMESPACE, user_id)
+        key = f'last-modified:{self.basename}:{user_id}:{version}'
+        last_modified = cache.get(key)
+        if last_modified is None:
+            newest = self.get_validator_queryset().aggregate(
+                newest=Max('updated_at'))['newest']
+            last_modified = max(filter(None, [newest,
+                                              get_deleted_at(user_id)]))
+            cache.set(key, last_modified, settings.RESPONSE_CACHE_TIMEOUT)
+        etag = make_etag(user_id, version, request.build_absolute_uri())
+
+        return etag, last_modified
+
+    def get_detail_validators(self, request):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            updated_at = (self.get_validator_queryset()
+                          .filter(**{self.lookup_field: lookup})
+                          .values_list('updated_at', flat=True).first())
+        except (TypeError, ValueError, ValidationError):
+            # A malformed lookup; the view answers it with a 404.
+            return None, None
+        if updated_at is None:
+            return None, None
+
+        return (make_etag(request.build_absolute_uri(), updated_at),
+                updated_at)
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        return self._conditional(request, etag, last_modified,
+                                 super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_detail_validators(request)
+        return self._conditional(request, etag, last_modified,
+                                 super().retrieve, *args, **kwargs)
+
+    def _conditional(self, request, etag, last_modified, view, *args,
+                     **kwargs):
+        if etag is None:
+            return view(request, *args, **kwargs)
+
+        timestamp = to_timestamp(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+
+        return response
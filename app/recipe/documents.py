@@ -0,0 +1,201 @@
+"""
+Recipes rendered ahead of time.
+
+Every recipe has a `RecipeDocument` holding its JSON as the list and the
+detail endpoints return it. Writes render the document again in the same
+transaction (see recipe.signals): saving a recipe, changing its tags or
+ingredients, and renaming or deleting a tag or ingredient it uses. Inside
+`deferred()`, as serializer writes run, changes are collected and each
+document is rendered once when the block ends.
+
+`DocumentReadMixin` answers `list` and `retrieve` by joining stored
+documents. Image variants are the only part depending on the request, so
+documents are stored without them and the URLs are rendered on the way
+out, from the recipe's `image_variants` column, as their last field.
+Recipes without a document yet, and sparse fieldsets, take the regular
+path.
+
+Recipes lacking a document get one after every `migrate`, which
+backfills them when the table is added. After a deploy changing the API
+output, run `rebuild_recipe_documents` to render the existing ones again.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.models import Ingredient, Recipe, RecipeDocument, Tag
+from core.renderers import FastJSONRenderer, RawJSONResponse
+from django.apps import apps as global_apps
+from django.db.models import Prefetch
+from recipe.media import variant_urls
+
+VARIANTS = 'image_variants'
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+_local = threading.local()
+_renderer = FastJSONRenderer()
+
+
+def prefetches(relations=RELATIONS):
+    """Prefetch the relations ordered by id, the order documents and the
+    list's fast path use"""
+    return [Prefetch(relation,
+                     queryset=RELATIONS[relation].objects.order_by('id'))
+            for relation in relations]
+
+
+def _render(data):
+    return _renderer.render(data).decode('utf-8')
+
+
+_VARIANTS_KEY = f',{_render(VARIANTS)}:'
+
+
+def _stored(data):
+    data = OrderedDict(data)
+    data.pop(VARIANTS, None)
+    return _render(data)
+
+
+def render(recipes):
+    """Return `{id: (summary, detail)}` JSON of the recipes, without
+    their image variants"""
+    from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+
+    context = {'request': None}
+    summaries = RecipeSerializer(recipes, many=True, context=context).data
+    details = RecipeDetailSerializer(
+        recipes, many=True, context=context).data
+
+    return {recipe.id: (_stored(summary), _stored(detail))
+            for recipe, summary, detail in zip(recipes, summaries, details)}
+
+
+def refresh(recipe_ids, create=False, batch_size=500):
+    """
+    Render the documents of the recipes again, inserting the rows of new
+    recipes with `create`. Other changes only update rows: they may come
+    from a recipe being deleted in the same transaction, which must not
+    be given a new one.
+    """
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        _refresh(recipe_ids[start:start + batch_size], create)
+
+
+def _refresh(recipe_ids, create):
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids)
+                   .prefetch_related(*prefetches()))
+    if not recipes:
+        return
+
+    documents = [RecipeDocument(recipe_id=recipe_id, summary=summary,
+                                detail=detail)
+                 for recipe_id, (summary, detail) in render(recipes).items()]
+    if create:
+        RecipeDocument.objects.bulk_create(documents, ignore_conflicts=True)
+    else:
+        RecipeDocument.objects.bulk_update(documents, ['summary', 'detail'])
+
+
+def changed(recipe_ids, create=False):
+    """Refresh the recipes' documents now, or at the end of `deferred()`"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        refresh(recipe_ids, create)
+        return
+
+    for recipe_id in recipe_ids:
+        pending[recipe_id] = pending.get(recipe_id, False) or create
+
+
+@contextmanager
+def deferred():
+    """Render each document changed in the block once, as it ends"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+
+    _local.pending = pending = {}
+    try:
+        yield
+    finally:
+        _local.pending = None
+
+    refresh([pk for pk, create in pending.items() if create], create=True)
+    refresh([pk for pk, create in pending.items() if not create])
+
+
+def backfill(apps=global_apps, **kwargs):
+    """Render the documents of recipes that have none, on post_migrate"""
+    try:
+        apps.get_model('core', 'RecipeDocument')
+    except LookupError:
+        return
+
+    refresh(Recipe.objects.filter(document__isnull=True)
+            .values_list('id', flat=True), create=True)
+
+
+def with_variants(request, document, recipe_id, variants):
+    """Append the image variants, with URLs for the request, to a stored
+    document as its last field"""
+    urls = variant_urls(request, recipe_id, variants)
+    return document[:-1] + _VARIANTS_KEY + _render([urls])[1:-1] + '}'
+
+
+class DocumentReadMixin:
+    """Serve `list` and `retrieve` from stored documents"""
+    document_reads = True
+
+    def reads_documents(self):
+        return (self.document_reads and
+                'fields' not in self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        if not self.reads_documents():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = {'id', 'document__summary', VARIANTS}.union(
+            self.get_row_columns())
+        rows = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            page = list(rows)
+        if any(row['document__summary'] is None for row in page):
+            return super().list(request, *args, **kwargs)
+
+        results = '[' + ','.join(
+            with_variants(request, row['document__summary'], row['id'],
+                          row[VARIANTS])
+            for row in page) + ']'
+        if self.paginator is None:
+            return RawJSONResponse(results)
+
+        envelope = self.get_paginated_response(None).data
+        return RawJSONResponse(self._join(envelope, results))
+
+    @staticmethod
+    def _join(envelope, results):
+        """Render the paginated envelope around the results' JSON"""
+        # Values are rendered in a list, as None alone renders to nothing.
+        return '{' + ','.join(
+            f'{_render(key)}:'
+            f'{results if key == "results" else _render([value])[1:-1]}'
+            for key, value in OrderedDict(envelope).items()) + '}'
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.reads_documents():
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            try:
+                row = (self.get_queryset().filter(pk=lookup)
+                       .values_list('pk', 'document__detail', VARIANTS)
+                       .first())
+            except (TypeError, ValueError):
+                row = None
+            if row is not None and row[1] is not None:
+                return RawJSONResponse(with_variants(
+                    request, row[1], row[0], row[2]))
+
+        return super().retrieve(request, *args, **kwargs)
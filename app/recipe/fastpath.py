@@ -0,0 +1,139 @@
+"""
+Read path for list endpoints that skips serializer instances.
+
+`FastListMixin.list()` selects `values()` rows holding just the columns
+the serializer's fields read, and renders each of them with the bound
+fields' own `to_representation()`, giving the same output as serializing
+model instances. Many-to-many fields rendered by a nested serializer are
+read with one query on their link table and grouped in a single pass,
+ordered by the related primary key like the views' prefetches. Fields
+that read anything else can offer `row_columns` and
+`to_row_representation(row)`; a serializer with a field that doesn't
+falls back to the regular path.
+"""
+from collections import defaultdict
+
+from core.renderers import FastJSONRenderer
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+
+class Unsupported(Exception):
+    """The serializer has a field rows can't be rendered for"""
+
+
+class RowPlan:
+    """How to render a serializer's output from `values()` rows"""
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        self.pk = model._meta.pk.attname
+        self.columns = {self.pk}
+        self.steps = []
+        self.relations = {}
+
+        for name, field in serializer.fields.items():
+            if hasattr(field, 'to_row_representation'):
+                self.columns.update(field.row_columns)
+                self.steps.append((name, None, field.to_row_representation))
+            elif isinstance(field, ListSerializer):
+                self.relations[name] = (self._m2m_field(model, field),
+                                        RowPlan(field.child))
+                self.steps.append((name, None, None))
+            else:
+                column = self._column(model, field)
+                self.columns.add(column)
+                self.steps.append((name, column, field.to_representation))
+
+    @staticmethod
+    def _model_field(model, field):
+        if field.source == '*' or '.' in field.source:
+            raise Unsupported(field.field_name)
+        try:
+            return model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise Unsupported(field.field_name)
+
+    def _column(self, model, field):
+        model_field = self._model_field(model, field)
+        if not model_field.concrete or model_field.is_relation:
+            raise Unsupported(field.field_name)
+        return model_field.attname
+
+    def _m2m_field(self, model, field):
+        model_field = self._model_field(model, field)
+        if not model_field.many_to_many or model_field.auto_created:
+            raise Unsupported(field.field_name)
+        return model_field
+
+    def represent(self, rows):
+        """Render rows, fetching the related items of all of them first"""
+        ids = [row[self.pk] for row in rows]
+        related = {name: self._fetch(field, plan, ids)
+                   for name, (field, plan) in self.relations.items()}
+
+        items = []
+        for row in rows:
+            item = {}
+            for name, column, to_representation in self.steps:
+                if name in related:
+                    item[name] = related[name].get(row[self.pk], [])
+                elif column is None:
+                    item[name] = to_representation(row)
+                else:
+                    value = row[column]
+                    item[name] = (None if value is None
+                                  else to_representation(value))
+            items.append(item)
+
+        return items
+
+    def _fetch(self, field, plan, ids):
+        """`{id: [item, ...]}` of the related rows, in one query"""
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        columns = sorted(plan.columns)
+        links = (through.objects.filter(**{f'{source}_id__in': ids})
+                 .order_by(f'{target}_id')
+                 .values_list(f'{source}_id',
+                              *[f'{target}__{column}' for column in columns]))
+
+        grouped = defaultdict(list)
+        for owner, *values in links:
+            grouped[owner].append(dict(zip(columns, values)))
+        for owner, rows in grouped.items():
+            grouped[owner] = plan.represent(rows)
+
+        return grouped
+
+
+class FastListMixin:
+    """Serve `list` from `values()` rows instead of serializer instances"""
+    fast_list = True
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        try:
+            plan = RowPlan(self.get_serializer())
+        except Unsupported:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = plan.columns.union(self.get_row_columns())
+        rows = queryset.prefetch_related(None).values(*columns)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page))
+
+        return Response(plan.represent(list(rows)))
+
+    def get_row_columns(self):
+        """Columns or annotations the view needs beyond the serializer's,
+        such as the pagination key"""
+        return []
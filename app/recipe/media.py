@@ -0,0 +1,178 @@
+"""
+Serving recipe image files.
+
+Permissions are checked by the API, but the bytes are sent by whatever
+`MEDIA_SERVE_BACKEND` names: `nginx` answers with an `X-Accel-Redirect`
+to the internal `MEDIA_ACCEL_REDIRECT_PREFIX` location, `sendfile` with
+an `X-Sendfile` header for Apache or lighttpd, and `django` streams the
+file itself through `wsgi.file_wrapper` so servers with `sendfile(2)`
+support copy it without passing through Python. Only the `django`
+backend handles `Range` requests itself; the proxies do it natively.
+
+Stored names never change content, so responses may be cached for good.
+"""
+import mimetypes
+import os
+import re
+
+from core.models import Recipe
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+class RangeFile:
+    """A file limited to `length` bytes from `start`; it has no `fileno`
+    so servers stream it in Python rather than sending the whole file"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_url(request, recipe_id, name):
+    """URL of a stored file of the recipe, absolute when there's a
+    request to build it from"""
+    if settings.MEDIA_PROTECTED:
+        url = reverse('recipe:recipe-media',
+                      kwargs={'pk': recipe_id, 'name': name})
+    else:
+        url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        url = request.build_absolute_uri(url)
+
+    return url
+
+
+def variant_urls(request, recipe_id, variants):
+    """URLs of the recipe's image variants by size and format, None
+    until they have been generated"""
+    if not variants:
+        return None
+
+    return {variant: {extension: media_url(request, recipe_id, name)
+                      for extension, name in names.items()}
+            for variant, names in variants.items()}
+
+
+def recipe_files(recipe):
+    """Names of the stored files belonging to the recipe"""
+    names = set()
+    if recipe.image:
+        names.add(recipe.image.name)
+    for variants in (recipe.image_variants or {}).values():
+        names.update(variants.values())
+
+    return names
+
+
+def parse_range(header, size):
+    """
+    Return `(start, end)` of a single byte range, inclusive, None for a
+    header that isn't one (the whole file is served), or False when the
+    range lies past the end of the file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if not suffix:
+            return False
+        return max(0, size - suffix), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+def serve(request, storage, name):
+    """Respond with the stored file `name` once access has been granted"""
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File not found.')
+
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    backend = settings.MEDIA_SERVE_BACKEND
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = iri_to_uri(
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + name)
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _file_response(
+            request, path, stat.st_size, content_type,
+            _if_range_matches(request, etag, last_modified))
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def _file_response(request, path, size, content_type, ranged):
+    header = request.META.get('HTTP_RANGE') if ranged else None
+    byte_range = parse_range(header, size) if header else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(RangeFile(file, start, length),
+                            content_type=content_type, status=206)
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,231 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a `(key, id)` keyset.
+
+    Every page seeks past the previous one with the row comparison
+    `(key, id) > (value, last_id)`, spelled out as `key >= value AND
+    (key > value OR (key = value AND id > last_id))` against an index on
+    `(user_id, key, id)`. The redundant first bound is where the planner
+    starts the index range scan; the OR alone would only filter rows.
+    There is no OFFSET and no COUNT(*), so the cost of a page does not
+    depend on how deep into the list it is.
+
+    The view declares the allowed keys in `ordering_fields` and the
+    default in `ordering`, or per request through `get_ordering_fields()`
+    and `get_ordering()`.
+    """
+    page_size = 25
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = _('Invalid cursor')
+    invalid_ordering_message = _('Invalid ordering "{ordering}".')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+        self.key, self.descending = self._split_ordering(self.ordering)
+
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = cursor is not None and cursor['reverse']
+        descending = self.descending != self.reverse
+
+        queryset = queryset.order_by(*self._order_by(descending))
+        if cursor is not None:
+            queryset = queryset.filter(
+                self._seek(cursor['value'], cursor['id'], descending))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        fields = getattr(view, 'ordering_fields', ['id'])
+        choices = ', '.join(f'`{field}`, `-{field}`' for field in fields)
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.ordering_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Sort key, one of {choices}.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        if hasattr(view, 'get_ordering'):
+            default = view.get_ordering()
+        else:
+            default = getattr(view, 'ordering', '-id')
+        if hasattr(view, 'get_ordering_fields'):
+            fields = view.get_ordering_fields()
+        else:
+            fields = getattr(view, 'ordering_fields', None)
+
+        ordering = request.query_params.get(
+            self.ordering_query_param, default)
+        key, descending = self._split_ordering(ordering)
+
+        if fields is not None and key not in fields:
+            msg = self.invalid_ordering_message.format(ordering=ordering)
+            raise exceptions.ValidationError({self.ordering_query_param: msg})
+
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, item, reverse):
+        payload = {
+            'o': self.ordering,
+            'v': self._value(item, self.key),
+            'id': self._value(item, 'id'),
+            'r': reverse,
+        }
+        data = json.dumps(payload, separators=(',', ':'), default=str)
+        token = urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode('ascii')))
+            if payload['o'] != self.ordering:
+                raise ValueError('Cursor belongs to another ordering')
+
+            return {
+                'value': self._to_python(queryset, payload['v']),
+                'id': int(payload['id']),
+                'reverse': bool(payload['r']),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+    def _order_by(self, descending):
+        prefix = '-' if descending else ''
+        if self.key == 'id':
+            return [f'{prefix}id']
+
+        return [f'{prefix}{self.key}', f'{prefix}id']
+
+    def _seek(self, value, pk, descending):
+        lookup = 'lt' if descending else 'gt'
+        if self.key == 'id':
+            return Q(**{f'id__{lookup}': pk})
+
+        bound = 'lte' if descending else 'gte'
+        return Q(**{f'{self.key}__{bound}': value}) & (
+            Q(**{f'{self.key}__{lookup}': value}) |
+            Q(**{self.key: value, f'id__{lookup}': pk}))
+
+    def _to_python(self, queryset, value):
+        """The cursor's value as the key's field or annotation would
+        have it, so that it compares equal to the row it came from"""
+        try:
+            field = queryset.model._meta.get_field(self.key)
+        except FieldDoesNotExist:
+            annotation = queryset.query.annotations.get(self.key)
+            if annotation is None:
+                return value
+            field = annotation.output_field
+
+        return field.to_python(value)
+
+    @staticmethod
+    def _value(item, key):
+        if isinstance(item, dict):
+            return item[key]
+
+        return getattr(item, key)
+
+    @staticmethod
+    def _split_ordering(ordering):
+        if ordering.startswith('-'):
+            return ordering[1:], True
+
+        return ordering, False
@@ -0,0 +1,167 @@
+"""
+On-the-fly resized recipe images.
+
+Renditions are cached as files under `IMAGE_RENDITION_CACHE_DIR`, sharded
+by the hash of `(image, width, format, quality)`. A hit refreshes the
+file's mtime, and once the directory grows past
+`IMAGE_RENDITION_CACHE_MAX_BYTES` the least recently used files are
+evicted down to 90% of the limit.
+
+Concurrent requests for a rendition that is not cached yet are coalesced
+within the process: one renders it while the others wait for its result.
+Files are written to a temporary name and renamed into place, so a race
+between processes costs a duplicate render at worst, never a torn file.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from core import images
+from django.conf import settings
+from rest_framework.negotiation import BaseContentNegotiation
+
+_renders = {}
+_renders_lock = threading.Lock()
+_size = None
+_size_lock = threading.Lock()
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Image responses bypass renderers, so any `Accept` is fine; errors
+    are rendered by the first renderer"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def rendition_path(name, width, image_format, quality):
+    digest = hashlib.sha1(
+        f'{name}|{width}|{image_format}|{quality}'.encode('utf-8')
+    ).hexdigest()
+    return os.path.join(settings.IMAGE_RENDITION_CACHE_DIR, digest[:2],
+                        f'{digest[2:]}.{image_format}')
+
+
+def _render(name, width, image_format, quality):
+    if not settings.IMAGE_VARIANT_WORKERS:
+        return images.render_resized(name, width, image_format, quality)
+
+    return images.get_executor().submit(
+        images.render_resized, name, width, image_format, quality).result()
+
+
+def _open(path):
+    rendition = open(path, 'rb')
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+    return rendition
+
+
+def get_rendition(name, width, image_format, quality):
+    """Return the open file of a rendition, rendering it if needed"""
+    path = rendition_path(name, width, image_format, quality)
+    while True:
+        try:
+            return _open(path)
+        except FileNotFoundError:
+            pass
+
+        with _renders_lock:
+            pending = _renders.get(path)
+            leader = pending is None
+            if leader:
+                pending = _renders[path] = {'done': threading.Event()}
+
+        if leader:
+            break
+        pending['done'].wait()
+        if 'error' in pending:
+            raise pending['error']
+
+    try:
+        return _store(path, _render(name, width, image_format, quality))
+    except Exception as exc:
+        pending['error'] = exc
+        raise
+    finally:
+        with _renders_lock:
+            del _renders[path]
+        pending['done'].set()
+
+
+def _store(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp, path)
+
+    # Open before accounting: an eviction may remove the file right away,
+    # but an open handle keeps it readable.
+    rendition = open(path, 'rb')
+    _account(len(data))
+    return rendition
+
+
+def _scan():
+    """Return `(size, mtime, path)` of every cached rendition"""
+    entries = []
+    root = settings.IMAGE_RENDITION_CACHE_DIR
+    if not os.path.isdir(root):
+        return entries
+
+    with os.scandir(root) as shards:
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as files:
+                for entry in files:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_size, stat.st_mtime, entry.path))
+
+    return entries
+
+
+def _account(added):
+    """Track the cache size, evicting least recently used files when it
+    outgrows the limit. Other processes write to the same directory, so
+    the running total is only an estimate and every eviction rescans."""
+    global _size
+    with _size_lock:
+        if _size is None:
+            _size = sum(size for size, _, _ in _scan())
+        else:
+            _size += added
+        if _size <= settings.IMAGE_RENDITION_CACHE_MAX_BYTES:
+            return
+
+        entries = sorted(_scan(), key=lambda entry: entry[1])
+        _size = sum(size for size, _, _ in entries)
+        target = settings.IMAGE_RENDITION_CACHE_MAX_BYTES * 0.9
+        for size, mtime, path in entries:
+            if _size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            _size -= size
+
+
+def reset_size():
+    global _size
+    with _size_lock:
+        _size = None
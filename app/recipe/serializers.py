@@ -1,4 +1,11 @@
-from core.models import Tag, Recipe, Ingredient
+from core.images import generate_variants, release_image
+from core.models import Tag, Recipe, Ingredient, RecipeStats
+from core.stats import TIME_BUCKETS
+from core.signals import bulk_created
+from django.db import transaction
+from recipe import documents
+from recipe.media import media_url, variant_urls
+from recipe.uploads import HeaderValidatedImageField
 from rest_framework import serializers
 
 
@@ -16,31 +23,155 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """Reject a name the user already has, as the (user, name)
+    constraint would. Not used by the recipe's nested serializers, where
+    existing names are looked up rather than created."""
+
+    def validate_name(self, value):
+        names = self.Meta.model.objects.filter(
+            user=self.context['request'].user, name=value)
+        if self.instance is not None:
+            names = names.exclude(pk=self.instance.pk)
+        if names.exists():
+            raise serializers.ValidationError(
+                f'You already have one named "{value}".')
+
+        return value
+
+
+class TagDetailSerializer(UniqueNameMixin, TagSerializer):
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class IngredientDetailSerializer(UniqueNameMixin, IngredientSerializer):
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+
+    @transaction.atomic
+    @documents.deferred()
+    def create(self, validated_data):
+        """Write a batch of recipes with one insert per table"""
+        auth_user = self.context['request'].user
+        ids = Recipe.objects.reserve_ids(len(validated_data))
+
+        recipes, tag_names, ingredient_names = [], [], []
+        for recipe_id, item in zip(ids, validated_data):
+            item = dict(item)
+            tag_names.append({tag['name'] for tag in item.pop('tags', [])})
+            ingredient_names.append({ingredient['name'] for ingredient
+                                     in item.pop('ingredients', [])})
+            recipes.append(Recipe(id=recipe_id, user=auth_user, **item))
+
+        Recipe.objects.bulk_create(recipes)
+        bulk_created.send(sender=Recipe, instances=recipes)
+
+        tags = Tag.objects.get_or_create_by_names(
+            auth_user, set().union(*tag_names))
+        ingredients = Ingredient.objects.get_or_create_by_names(
+            auth_user, set().union(*ingredient_names))
+        links = [
+            (Recipe.tags.through, [
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tags[name].id)
+                for recipe, names in zip(recipes, tag_names)
+                for name in names]),
+            (Recipe.ingredients.through, [
+                Recipe.ingredients.through(
+                    recipe_id=recipe.id, ingredient_id=ingredients[name].id)
+                for recipe, names in zip(recipes, ingredient_names)
+                for name in names]),
+        ]
+        for through, objs in links:
+            through.objects.bulk_create(objs)
+            bulk_created.send(sender=through, instances=objs)
+
+        return recipes
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized images by size and format, null until the
+    variants have been generated"""
+    row_columns = ['id', 'image_variants']
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return self.represent(recipe.pk, recipe.image_variants)
+
+    def to_row_representation(self, row):
+        return self.represent(row['id'], row['image_variants'])
+
+    def represent(self, recipe_id, variants):
+        return variant_urls(self.context.get('request'), recipe_id, variants)
+
+
+class SparseFieldsMixin:
+    """Render only the field names listed in the `fields` context entry,
+    when there is one"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+
+        return {name: field for name, field in fields.items()
+                if name in requested}
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ['id', 'price', 'time_minutes',
-                  'title', 'link', 'tags', 'ingredients']
+                  'title', 'link', 'tags', 'ingredients', 'image_variants']
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
 
     def _get_or_create_tags(self, tags, recipe):
         auth_user = self.context['request'].user
 
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        tag_objs = Tag.objects.get_or_create_by_names(
+            auth_user, [tag['name'] for tag in tags])
+        recipe.tags.add(*tag_objs.values())
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         auth_user = self.context['request'].user
 
-        for ingredient in ingredients:
-            ingredient, created = Ingredient.objects.get_or_create(
-                user=auth_user, **ingredient)
-            recipe.ingredients.add(ingredient)
+        ingredient_objs = Ingredient.objects.get_or_create_by_names(
+            auth_user, [ingredient['name'] for ingredient in ingredients])
+        recipe.ingredients.add(*ingredient_objs.values())
 
+    def _sync_attributes(self, manager, model, items):
+        """Link exactly `items` to the recipe, touching only the delta"""
+        auth_user = self.context['request'].user
+
+        # Served from the prefetch cache when the view prefetched it.
+        current = {obj.name: obj for obj in manager.all()}
+        names = {item['name'] for item in items}
+
+        stale = [obj for name, obj in current.items() if name not in names]
+        if stale:
+            manager.remove(*stale)
+
+        added = model.objects.get_or_create_by_names(
+            auth_user, names.difference(current))
+        if added:
+            manager.add(*added.values())
+
+    @transaction.atomic
+    @documents.deferred()
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
@@ -51,16 +182,17 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
+    @documents.deferred()
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._sync_attributes(instance.tags, Tag, tags)
 
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._sync_attributes(
+                instance.ingredients, Ingredient, ingredients)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -71,16 +203,60 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerializer(RecipeSerializer):
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']
+        # Image variants stay last, where stored documents append them.
+        fields = RecipeSerializer.Meta.fields[:-1] + [
+            'description', 'image_variants']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image = HeaderValidatedImageField()
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
-        extra_kwargs = {
-            'image': {
-                'required': 'True'
-            }
-        }
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.image:
+            data['image'] = media_url(
+                self.context.get('request'), instance.pk, instance.image.name)
+
+        return data
+
+    @transaction.atomic
+    @documents.deferred()
+    def update(self, instance, validated_data):
+        stale_image = instance.image.name
+        stale_variants = instance.image_variants
+        instance.image_variants = {}
+        recipe = super().update(instance, validated_data)
+
+        transaction.on_commit(
+            lambda: release_image(stale_image, stale_variants))
+        generate_variants(recipe)
+        return recipe
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    average_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True)
+    time_minutes_histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeStats
+        fields = ['recipe_count', 'average_price', 'median_price',
+                  'time_minutes_histogram']
+        read_only_fields = fields
+
+    def get_time_minutes_histogram(self, stats):
+        """Recipes per `time_minutes` range, `max` null for the last"""
+        counts = stats.time_histogram + [0] * (
+            len(TIME_BUCKETS) + 1 - len(stats.time_histogram))
+        bounds = [0] + TIME_BUCKETS
+        return [{'min': low,
+                 'max': high - 1 if high is not None else None,
+                 'count': count}
+                for low, high, count in zip(
+                    bounds, TIME_BUCKETS + [None], counts)]
@@ -0,0 +1,125 @@
+from core.models import Ingredient, Recipe, Tag
+from core.signals import bulk_created
+from core.versions import bump_version, invalidate
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from recipe import documents
+from recipe.autocomplete import version_namespace
+from recipe.cache import DATA_NAMESPACE
+from recipe.conditional import mark_deleted
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_autocomplete(sender, instance, **kwargs):
+    invalidate(version_namespace(sender), instance.user_id)
+
+
+@receiver(bulk_created, sender=Tag)
+@receiver(bulk_created, sender=Ingredient)
+def invalidate_autocomplete_in_bulk(sender, instances, **kwargs):
+    for user_id in {instance.user_id for instance in instances}:
+        invalidate(version_namespace(sender), user_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_data(sender, instance, **kwargs):
+    invalidate(DATA_NAMESPACE, instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def record_recipe_deletion(sender, instance, **kwargs):
+    mark_deleted(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_data_on_links(sender, instance, action, **kwargs):
+    # The instance is a recipe or, from the reverse side, a tag or an
+    # ingredient; both belong to the same user.
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        invalidate(DATA_NAMESPACE, instance.user_id)
+
+
+@receiver(bulk_created, sender=Recipe)
+@receiver(bulk_created, sender=Tag)
+@receiver(bulk_created, sender=Ingredient)
+def invalidate_user_data_in_bulk(sender, instances, **kwargs):
+    for user_id in {instance.user_id for instance in instances}:
+        invalidate(DATA_NAMESPACE, user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_document(sender, instance, created, raw=False,
+                            **kwargs):
+    if not raw:
+        documents.changed([instance.pk], create=created)
+
+
+@receiver(bulk_created, sender=Recipe)
+def create_recipe_documents(sender, instances, **kwargs):
+    documents.changed([recipe.pk for recipe in instances], create=True)
+
+
+@receiver(bulk_created, sender=Recipe.tags.through)
+@receiver(bulk_created, sender=Recipe.ingredients.through)
+def refresh_documents_in_bulk(sender, instances, **kwargs):
+    documents.changed({link.recipe_id for link in instances})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_documents_on_links(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            documents.changed([instance.pk])
+    elif action in ['post_add', 'post_remove']:
+        documents.changed(pk_set)
+    elif action == 'pre_clear':
+        # The links are gone by post_clear, which gets no pk_set.
+        instance._document_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True))
+    elif action == 'post_clear':
+        documents.changed(instance.__dict__.pop('_document_recipe_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_documents_on_rename(sender, instance, created, raw=False,
+                                **kwargs):
+    if not created and not raw:
+        documents.changed(instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_documents_on_delete(sender, instance, **kwargs):
+    instance._document_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_documents_on_delete(sender, instance, **kwargs):
+    documents.changed(instance.__dict__.pop('_document_recipe_ids', []))
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_user_versions(sender, instance, created, **kwargs):
+    # Start new accounts from fresh versions, even if a database reused
+    # the id of a deleted user.
+    if created:
+        for namespace in [version_namespace(Tag),
+                          version_namespace(Ingredient),
+                          DATA_NAMESPACE]:
+            bump_version(namespace, instance.id)
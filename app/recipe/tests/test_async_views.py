@@ -0,0 +1,213 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from core.models import Recipe, StoredFile
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (AsyncRequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+from PIL import Image
+from recipe import async_views
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from unittest.mock import patch
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def create_image(image_file):
+    Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+    image_file.seek(0)
+
+
+class UploadMixin:
+    def upload(self, recipe_id, data):
+        request = AsyncRequestFactory().post(
+            image_upload_url(recipe_id), data, **self.auth())
+        # Buffered up front, as ASGI servers do: the test payload refuses
+        # the parser's reads past its end.
+        request.body
+        try:
+            return async_to_sync(async_views.upload_image_view)(
+                request, pk=str(recipe_id))
+        finally:
+            # Removes the uploaded temporary files, as the handler does.
+            request.close()
+
+    def auth(self):
+        return {'authorization': f'Token {self.token.key}'}
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls', ASYNC_ORM_THREADS=0,
+                   ASYNC_FILE_THREADS=0)
+class AsyncRecipeViewTests(UploadMixin, TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='async@example.com', password='passtest123')
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('3.20'))
+        cache.clear()
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        self.recipe.image.delete()
+
+    def get(self, url, **headers):
+        async def get():
+            return await self.async_client.get(url, **headers)
+
+        return async_to_sync(get)()
+
+    def test_routes_to_async_views(self):
+        self.assertIs(resolve(RECIPES_URL).func, async_views.list_view)
+        self.assertIs(resolve(image_upload_url(1)).func,
+                      async_views.upload_image_view)
+
+    def test_list_and_detail_match_sync_views(self):
+        for url in [RECIPES_URL, detail_url(self.recipe.id)]:
+            res = self.get(url, **self.auth())
+            cache.clear()
+            with override_settings(ROOT_URLCONF='app.urls'):
+                expected = self.client.get(
+                    url, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.content, expected.content)
+
+    def test_auth_required(self):
+        res = self.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_upload_image(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            create_image(image_file)
+            res = self.upload(self.recipe.id, {'image': image_file})
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.recipe.image.storage.exists(
+            self.recipe.image.name))
+        self.assertIn(str(self.recipe.id), json.loads(res.content)['image'])
+
+    def test_upload_image_bad_request(self):
+        res = self.upload(self.recipe.id, {'image': 'notimage'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', json.loads(res.content))
+
+    def test_upload_image_other_users_recipe(self):
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='passtest123')
+        recipe = Recipe.objects.create(
+            user=other, title='Stew', time_minutes=5, price=Decimal('1.00'))
+
+        res = self.upload(recipe.id, {})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_image_get_not_allowed(self):
+        res = self.get(image_upload_url(self.recipe.id), **self.auth())
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls', ASYNC_ORM_THREADS=2,
+                   ASYNC_FILE_THREADS=2, IMAGE_VARIANT_WORKERS=0)
+class AsyncUploadPoolTests(UploadMixin, TransactionTestCase):
+    """Uploads with every step on the real pools, which only see
+    committed data"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='pools@example.com', password='passtest123')
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('3.20'))
+
+    def tearDown(self):
+        async_views.shutdown_executors()
+        self.recipe.refresh_from_db()
+        self.recipe.image.delete()
+
+    def upload_image(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            create_image(image_file)
+            return self.upload(self.recipe.id, {'image': image_file})
+
+    def test_upload_counts_one_reference(self):
+        res = self.upload_image()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.recipe.image.storage.exists(
+            self.recipe.image.name))
+        self.assertEqual(
+            StoredFile.objects.get(name=self.recipe.image.name).refcount, 1)
+
+    def test_failed_save_releases_stored_file(self):
+        stored = []
+        store = async_views.ImageUpload.store
+
+        def track(upload, recipe, image):
+            stored.append(store(upload, recipe, image))
+            return stored[-1]
+
+        with patch.object(async_views.ImageUpload, 'store', track), \
+                patch.object(async_views.ImageUpload, 'save',
+                             side_effect=ValidationError({'image': ['No']})):
+            res = self.upload_image()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image)
+        self.assertEqual(len(stored), 1)
+        self.assertFalse(StoredFile.objects.filter(name=stored[0]).exists())
+        self.assertFalse(self.recipe.image.storage.exists(stored[0]))
+
+
+class BoundedPoolTests(SimpleTestCase):
+    def tearDown(self):
+        async_views.shutdown_executors()
+
+    @override_settings(ASYNC_ORM_THREADS=2)
+    def test_orm_pool_is_bounded(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return threading.current_thread().name
+
+        async def run():
+            return await asyncio.gather(
+                *[async_views.run_orm(work) for _ in range(8)])
+
+        names = async_to_sync(run)()
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(len(set(names)), 2)
+        self.assertTrue(all(name.startswith('async-orm')
+                            for name in names))
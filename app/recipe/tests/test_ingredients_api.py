@@ -1,12 +1,14 @@
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
+from core.tests.utils import QueryBudgetMixin
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
-from recipe.serializers import IngredientSerializer
+from recipe.serializers import IngredientDetailSerializer
 from rest_framework import status
 from rest_framework.test import APIClient
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 INGREDIENT_MOCK_OBJECT = {'name': 'Parmesan'}
 
 
@@ -34,7 +36,7 @@ class PublicTagApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagApiTests(TestCase):
+class PrivateTagApiTests(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = create_user()
@@ -47,7 +49,7 @@ class PrivateTagApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         ingredients = Ingredient.objects.all().order_by('-name')
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientDetailSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
@@ -78,6 +80,27 @@ class PrivateTagApiTests(TestCase):
         ingredient.refresh_from_db()
         self.assertEqual(ingredient.name, payload['name'])
 
+    def test_rename_to_existing_name(self):
+        create_ingredient(self.user, name='Salt')
+        ingredient = create_ingredient(self.user, name='Pepper')
+
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Salt'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Pepper')
+
+    def test_update_keeping_name(self):
+        ingredient = create_ingredient(self.user, name='Salt')
+        other = create_user(email='other@example.com')
+        create_ingredient(other, name='Pepper')
+
+        for name in ['Salt', 'Pepper']:
+            res = self.client.put(detail_url(ingredient.id), {'name': name})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delete_ingredient(self):
         ingredient = create_ingredient(self.user, name='Cheese')
 
@@ -86,3 +109,100 @@ class PrivateTagApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Ingredient.objects.all().count(), 0)
+
+    def test_list_ingredients_query_budget(self):
+        for i in range(20):
+            create_ingredient(self.user, name=f'Ingredient {i}')
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(INGREDIENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 20)
+
+    def test_filter_assigned_only(self):
+        used = create_ingredient(self.user, name='Used')
+        create_ingredient(self.user, name='Unused')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5)
+        recipe.ingredients.add(used)
+
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data], ['Used'])
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_filter_min_count_and_sort_by_popularity(self):
+        ingredients = [create_ingredient(self.user, name=name)
+                       for name in ['Rare', 'Common', 'Unused']]
+        for count in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title='Soup', time_minutes=5, price=5)
+            recipe.ingredients.add(ingredients[1])
+            if not count:
+                recipe.ingredients.add(ingredients[0])
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(
+                INGREDIENTS_URL, {'min_count': 1, 'ordering': 'popularity'})
+
+        self.assertEqual([(item['name'], item['recipe_count'])
+                          for item in res.data],
+                         [('Common', 3), ('Rare', 1)])
+
+        res = self.client.get(INGREDIENTS_URL, {'min_count': 2})
+        self.assertEqual([item['name'] for item in res.data], ['Common'])
+
+    def test_invalid_filters(self):
+        for params in [{'assigned_only': 'yes'}, {'min_count': -1},
+                       {'ordering': 'id'}]:
+            res = self.client.get(INGREDIENTS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_prefix(self):
+        for name in ['Tomato', 'tofu', 'Toast', 'Bread']:
+            create_ingredient(self.user, name=name)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'TO'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data],
+                         ['Toast', 'tofu', 'Tomato'])
+
+    def test_autocomplete_tolerates_typos(self):
+        tomato = create_ingredient(self.user, name='Tomato')
+        create_ingredient(self.user, name='Bread')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tomtao'})
+
+        self.assertEqual(res.data, [{'id': tomato.id, 'name': 'Tomato'}])
+
+    def test_autocomplete_sees_writes(self):
+        create_ingredient(self.user, name='Tomato')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'to'})
+
+        create_ingredient(self.user, name='Tortilla')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tor'})
+
+        self.assertEqual([item['name'] for item in res.data], ['Tortilla'])
+
+    def test_autocomplete_limited_to_user(self):
+        other_user = create_user(email='other@example.com')
+        create_ingredient(other_user, name='Tomato')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom'})
+
+        self.assertEqual(res.data, [])
+
+    def test_autocomplete_served_from_memory(self):
+        for i in range(50):
+            create_ingredient(self.user, name=f'Ingredient {i}')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'ingredient'})
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL,
+                                  {'q': 'ingredient 1', 'limit': 5})
+
+        self.assertEqual(len(res.data), 5)
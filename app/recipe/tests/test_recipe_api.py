@@ -1,17 +1,43 @@
 from decimal import Decimal
 
-from core.models import Recipe, Tag, Ingredient
+from core import images, search
+from core.images import delete_variants
+from core.models import Recipe, RecipeDocument, Tag, Ingredient
+from core.tests.utils import QueryBudgetMixin
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast
 from django.urls import reverse
+from recipe import cache as response_cache
+from recipe import renditions
+from recipe.pagination import KeysetPagination
 from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+from recipe.views import RecipesViewSet, TagViewSet
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 import tempfile
+import threading
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.management.sql import emit_post_migrate_signal
 import os
-from PIL import Image
+import csv
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+from PIL import Image, ImageFile
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+STATS_URL = reverse('recipe:recipe-stats')
 RECIPE_MOCK_OBJECT = {'title': 'Sample recipe title',
                       'description': 'Sample recipe description',
                       'price': Decimal('10.5'),
@@ -27,6 +53,14 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def image_url(recipe_id):
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
+def media_url(recipe_id, name):
+    return reverse('recipe:recipe-media', args=[recipe_id, name])
+
+
 def create_recipe(user, **params):
     defaults = RECIPE_MOCK_OBJECT
     defaults.update(params)
@@ -69,7 +103,7 @@ class PublicRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTests(TestCase):
+class PrivateRecipeApiTests(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = create_user()
@@ -84,7 +118,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         create_recipe(self.user)
@@ -98,7 +132,169 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_query_budget(self):
+        for count in [2, 20]:
+            Recipe.objects.all().delete()
+            Tag.objects.all().delete()
+            Ingredient.objects.all().delete()
+            for i in range(count):
+                recipe = create_recipe(self.user)
+                recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+                recipe.ingredients.add(
+                    create_ingredient(self.user, name=f'Ingredient {i}'))
+
+            with self.assertMaxQueries(4):
+                res = self.client.get(RECIPES_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data['results']), count)
+
+    def test_list_recipes_paginated_by_keyset(self):
+        prices = ['3.00', '1.00', '2.00', '1.00', '5.00']
+        for price in prices:
+            create_recipe(self.user, price=Decimal(price))
+
+        expected = list(Recipe.objects.filter(user=self.user)
+                        .order_by('price', 'id').values_list('id', flat=True))
+        seen = []
+        url = f'{RECIPES_URL}?ordering=price&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen.extend(recipe['id'] for recipe in res.data['results'])
+            url = res.data['next']
+            for query in ctx.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'].upper())
+                self.assertNotIn('COUNT(', query['sql'].upper())
+
+        self.assertEqual(seen, expected)
+
+    def test_list_recipes_previous_page(self):
+        for minutes in range(5):
+            create_recipe(self.user, time_minutes=minutes)
+
+        first = self.client.get(
+            RECIPES_URL, {'ordering': '-time_minutes', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [recipe['time_minutes'] for recipe in second.data['results']],
+            [2, 1])
+        self.assertEqual(previous.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_list_recipes_invalid_ordering(self):
+        res = self.client.get(RECIPES_URL, {'ordering': 'description'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_unknown_ordering(self):
+        create_recipe(self.user)
+
+        for params in [{'ordering': 'foo'},
+                       {'ordering': '-foo', 'fields': 'id,title'}]:
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ordering', res.data)
+
+    def test_list_recipes_sparse_fields(self):
+        for i in range(3):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for recipe in res.data['results']:
+            self.assertEqual(set(recipe), {'id', 'title'})
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('core_recipe_tags', sql)
+        self.assertNotIn('"core_recipe"."link"', sql)
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_sparse_fields_keep_keyset_pagination(self):
+        for price in ['3.00', '1.00', '2.00']:
+            create_recipe(self.user, price=Decimal(price))
+
+        first = self.client.get(RECIPES_URL, {
+            'fields': 'title,tags', 'ordering': 'price', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertEqual(set(second.data['results'][0]), {'title', 'tags'})
+
+    def test_retrieve_recipe_sparse_fields(self):
+        recipe = create_recipe(self.user)
+        recipe.ingredients.add(create_ingredient(self.user, name='Salt'))
+
+        with self.assertMaxQueries(3):
+            res = self.client.get(detail_url(recipe.id),
+                                  {'fields': 'description,ingredients'})
+
+        self.assertEqual(res.data, {
+            'description': recipe.description,
+            'ingredients': [{'id': recipe.ingredients.get().id,
+                             'name': 'Salt'}]})
+
+    def test_sparse_fields_invalid(self):
+        for fields in ['id,secret', ',', 'description']:
+            res = self.client.get(RECIPES_URL, {'fields': fields})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_invalid_cursor(self):
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_recipes_ranked_by_title_first(self):
+        in_description = create_recipe(
+            self.user, title='Soup', description='Made with tomato')
+        in_title = create_recipe(
+            self.user, title='Tomato pie', description='Baked')
+        create_recipe(self.user, title='Pancakes', description='Sweet')
+        create_recipe(create_user(email='other@example.com'),
+                      title='Tomato salad', description='')
+
+        res = self.client.get(RECIPES_URL, {'search': 'tomato'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data['results']],
+                         [in_title.id, in_description.id])
+
+    def test_search_recipes_follows_updates(self):
+        recipe = create_recipe(self.user, title='Curry', description='')
+        recipe.title = 'Green curry'
+        recipe.save()
+
+        res = self.client.get(RECIPES_URL, {'search': 'green'})
+
+        self.assertEqual(len(res.data['results']), 1)
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, {'search': 'green'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_recipes_paginates_by_rank(self):
+        for i in range(5):
+            create_recipe(self.user, title=f'Bread {i}',
+                          description='bread ' * i)
+        seen = []
+        url = f'{RECIPES_URL}?search=bread&page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen.extend(recipe['id'] for recipe in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(sorted(seen), sorted(
+            Recipe.objects.filter(user=self.user).values_list(
+                'id', flat=True)))
 
     def test_get_recipe_detail(self):
         recipe = create_recipe(self.user)
@@ -110,6 +306,20 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_get_recipe_detail_query_budget(self):
+        recipe = create_recipe(self.user)
+        for i in range(10):
+            recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                create_ingredient(self.user, name=f'Ingredient {i}'))
+
+        with self.assertMaxQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 10)
+        self.assertEqual(len(res.data['ingredients']), 10)
+
     def test_create_recipe(self):
         res = self.client.post(RECIPES_URL, RECIPE_MOCK_OBJECT)
 
@@ -244,6 +454,34 @@ class PrivateRecipeApiTests(TestCase):
             self.assertTrue(recipe.tags.filter(
                 name=tag['name'], user=self.user).exists())
 
+    def test_create_with_many_tags_and_ingredients_query_budget(self):
+        create_tag(self.user, name='Tag 0')
+        create_ingredient(self.user, name='Ingredient 0')
+        payload = RECIPE_MOCK_OBJECT.copy()
+        payload.update({
+            'tags': [{'name': f'Tag {i}'} for i in range(10)],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(30)],
+        })
+
+        with self.assertMaxQueries(27):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 10)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 10)
+
+    def test_create_with_duplicated_tag_names(self):
+        payload = RECIPE_MOCK_OBJECT.copy()
+        payload['tags'] = [{'name': 'Thai'}, {'name': 'Thai'}]
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
     def test_create_tag_when_updating_recipe(self):
         recipe = create_recipe(user=self.user)
 
@@ -276,6 +514,46 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(lunch_tag, recipe.tags.all())
         self.assertNotIn(indian_tag, recipe.tags.all())
 
+    def test_update_recipe_tags_touches_only_delta(self):
+        recipe = create_recipe(user=self.user)
+        for i in range(20):
+            recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+        through = Recipe.tags.through
+        kept_links = set(through.objects.filter(recipe=recipe)
+                         .exclude(tag__name='Tag 0')
+                         .values_list('id', flat=True))
+
+        payload = {'tags': [{'name': f'Tag {i}'} for i in range(1, 20)]}
+        payload['tags'].append({'name': 'Brunch'})
+
+        with self.assertMaxQueries(22):
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        links = set(through.objects.filter(recipe=recipe)
+                    .values_list('id', flat=True))
+        self.assertEqual(len(links), 20)
+        self.assertTrue(kept_links < links)
+        self.assertFalse(recipe.tags.filter(name='Tag 0').exists())
+        self.assertTrue(recipe.tags.filter(name='Brunch').exists())
+
+    def test_update_recipe_same_tags_writes_nothing(self):
+        recipe = create_recipe(user=self.user)
+        for i in range(20):
+            recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+        payload = {'tags': [{'name': f'Tag {i}'} for i in range(20)]}
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [query['sql'] for query in ctx.captured_queries
+                  if 'core_recipe_tags' in query['sql'] and
+                  query['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(writes, [])
+
     def test_clear_recipes_tags(self):
         recipe = create_recipe(user=self.user)
         tag = create_tag(user=self.user)
@@ -404,6 +682,574 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(recipe.ingredients.count(), 0)
 
 
+def bulk_payload(count, **params):
+    return [dict({'title': f'Recipe {i}',
+                  'price': '5.00',
+                  'time_minutes': 10,
+                  'tags': [{'name': 'Dinner'}, {'name': f'Tag {i % 3}'}],
+                  'ingredients': [{'name': 'Salt'}]}, **params)
+            for i in range(count)]
+
+
+class KeysetCursorTests(TestCase):
+    """Cursor values come back exactly as the rows they were taken from"""
+
+    def round_trip(self, annotation, value):
+        paginator = KeysetPagination()
+        paginator.base_url = 'http://testserver/api/recipe/recipes/'
+        paginator.ordering = '-rank'
+        paginator.key, paginator.descending = 'rank', True
+        url = paginator.encode_cursor({'rank': value, 'id': 7}, False)
+        request = Request(APIRequestFactory().get(url))
+
+        cursor = paginator.decode_cursor(
+            request, Recipe.objects.annotate(rank=annotation))
+
+        self.assertEqual(cursor['id'], 7)
+        return cursor['value']
+
+    def test_numeric_rank(self):
+        value = self.round_trip(
+            Cast(Value(0.0607927), search.RANK_FIELD), Decimal('0.060793'))
+
+        self.assertIsInstance(value, Decimal)
+        self.assertEqual(value, Decimal('0.060793'))
+
+    def test_float_rank(self):
+        rank = 0.1 + 0.2
+
+        value = self.round_trip(Value(rank, output_field=FloatField()), rank)
+
+        self.assertEqual(value, rank)
+
+    def test_seek_bounds_the_key(self):
+        paginator = KeysetPagination()
+        paginator.key = 'price'
+
+        for descending, bound in [(False, '>='), (True, '<=')]:
+            queryset = Recipe.objects.filter(
+                paginator._seek(Decimal('5.00'), 7, descending))
+
+            # ANDed first, where the planner takes index conditions from.
+            where = str(queryset.query).split(' WHERE ', 1)[1]
+            self.assertTrue(
+                where.startswith(f'("core_recipe"."price" {bound} 5'),
+                where)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Ranks ts_rank()')
+    def test_search_rank_is_numeric(self):
+        user = create_user()
+        create_recipe(user, title='Bread', description='bread bread')
+
+        ranks = search.search_recipes(
+            Recipe.objects.filter(user=user), 'bread').values_list(
+            'rank', flat=True)
+
+        self.assertIsInstance(ranks[0], Decimal)
+
+
+class BulkRecipeApiTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_recipes(self):
+        create_tag(self.user, name='Dinner')
+        payload = bulk_payload(5)
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['created']), 5)
+        self.assertEqual(res.data['errors'], [])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        for recipe in recipes:
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_bulk_create_query_budget(self):
+        for count in [5, 50]:
+            with self.assertMaxQueries(24):
+                res = self.client.post(
+                    BULK_URL, bulk_payload(count), format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_reports_item_errors(self):
+        payload = bulk_payload(3)
+        payload[1]['price'] = 'free'
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(len(res.data['created']), 2)
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('price', res.data['errors'][0]['errors'])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_atomic_rejects_batch(self):
+        payload = bulk_payload(3)
+        payload[2]['time_minutes'] = None
+
+        res = self.client.post(
+            f'{BULK_URL}?atomic=true', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][0]['index'], 2)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_create_requires_list(self):
+        res = self.client.post(BULK_URL, bulk_payload(1)[0], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeListCacheTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Cached')
+        self.recipe.tags.add(create_tag(self.user, name='Dinner'))
+        response_cache.reset_stats()
+
+    def test_second_list_served_from_cache(self):
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertMaxQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(response_cache.get_stats(),
+                         {'hits': 1, 'misses': 1})
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_recipe_write_invalidates(self):
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Fresh'})
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'Fresh')
+
+    def test_tag_rename_and_unlink_invalidate(self):
+        self.client.get(RECIPES_URL)
+
+        tag = Tag.objects.get(user=self.user)
+        tag.name = 'Supper'
+        tag.save()
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'Supper')
+
+        self.recipe.tags.clear()
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'], [])
+
+    def test_cache_is_per_user(self):
+        self.client.get(RECIPES_URL)
+        other_user = create_user(email='other@example.com')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = 'django.core.cache.backends.filebased.FileBasedCache'
+            with override_settings(CACHES={'default': {
+                    'BACKEND': backend, 'LOCATION': location}}):
+                self.client.get(RECIPES_URL)
+                res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data['results'][0]['title'], 'Cached')
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Tagged')
+        self.tag = create_tag(self.user, name='Dinner')
+        self.recipe.tags.add(self.tag)
+
+    def test_list_sets_validators(self):
+        res = self.client.get(RECIPES_URL)
+
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', res)
+
+    def test_list_if_none_match_not_modified(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_if_modified_since_not_modified(self):
+        last_modified = self.client.get(RECIPES_URL)['Last-Modified']
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_follows_query_string(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes_on_writes(self):
+        writes = [
+            lambda: self.client.patch(detail_url(self.recipe.id),
+                                      {'title': 'Renamed'}),
+            lambda: Tag.objects.filter(pk=self.tag.pk).first().save(),
+            lambda: self.recipe.tags.remove(self.tag),
+            lambda: create_recipe(self.user).delete(),
+        ]
+        for write in writes:
+            etag = self.client.get(RECIPES_URL)['ETag']
+            write()
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res['ETag'], etag)
+
+    def test_detail_if_none_match_not_modified(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.tag.name = 'Supper'
+        self.tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Supper')
+
+    def test_detail_of_other_user_not_found(self):
+        other = create_recipe(create_user(email='other@example.com'))
+
+        res = self.client.get(detail_url(other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', res)
+
+    def test_detail_malformed_id_not_found(self):
+        res = self.client.get(detail_url('abc'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', res)
+
+
+class RecipeStatsApiTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_stats(self):
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertIsNone(res.data['median_price'])
+        self.assertEqual(len(res.data['time_minutes_histogram']), 6)
+
+    def create_recipe(self, price, time_minutes=10):
+        return Recipe.objects.create(
+            user=self.user, title='Soup', price=Decimal(price),
+            time_minutes=time_minutes)
+
+    def test_stats_follow_writes(self):
+        for price, minutes in [('2.00', 10), ('3.00', 20), ('10.00', 45),
+                               ('4.00', 300)]:
+            self.create_recipe(price, minutes)
+        recipe = Recipe.objects.filter(user=self.user).get(time_minutes=45)
+        recipe.price = Decimal('5.00')
+        recipe.save()
+        Recipe.objects.get(user=self.user, time_minutes=300).delete()
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['average_price'], '3.33')
+        self.assertEqual(res.data['median_price'], '3.00')
+        self.assertEqual(res.data['time_minutes_histogram'][:3], [
+            {'min': 0, 'max': 14, 'count': 1},
+            {'min': 15, 'max': 29, 'count': 1},
+            {'min': 30, 'max': 59, 'count': 1},
+        ])
+        self.assertEqual(res.data['time_minutes_histogram'][-1],
+                         {'min': 240, 'max': None, 'count': 0})
+
+    def test_even_count_median_and_bulk_create(self):
+        res = self.client.post(BULK_URL, bulk_payload(2), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.create_recipe('8.25')
+        self.create_recipe('8.50')
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 4)
+        self.assertEqual(res.data['median_price'], '6.63')
+
+    def test_stats_limited_to_user(self):
+        other = create_user(email='other@example.com')
+        Recipe.objects.create(user=other, title='Soup', price=Decimal('1'),
+                              time_minutes=5)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+
+
+class FastListPathTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Crème \u2028 {i}', time_minutes=i,
+                price=Decimal(f'{i}.5'), link=f'http://example.com/{i}')
+            recipe.tags.add(*Tag.objects.get_or_create_by_names(
+                self.user, [f'Tag {j}' for j in range(i, -1, -1)]).values())
+            if i % 2:
+                recipe.ingredients.add(create_ingredient(
+                    self.user, name=f'Ingredient {i}'))
+        recipe.image_variants = {'thumb': {'jpeg': 'uploads/recipe/a.jpg',
+                                           'webp': 'uploads/recipe/a.webp'}}
+        recipe.save()
+
+    def assertSameAsSerializer(self, url, params=None):
+        documents = self.client.get(url, params)
+        cache.clear()
+        with patch.object(RecipesViewSet, 'document_reads', False):
+            fast = self.client.get(url, params)
+            cache.clear()
+            with patch.object(RecipesViewSet, 'fast_list', False), \
+                    patch.object(RecipesViewSet, 'renderer_classes',
+                                 [JSONRenderer]):
+                slow = self.client.get(url, params)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(documents.content, slow.content)
+        return documents
+
+    def test_list_matches_serializer(self):
+        res = self.assertSameAsSerializer(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 4)
+
+    def test_ordered_paginated_and_sparse_lists_match(self):
+        for params in [{'ordering': 'price', 'page_size': 3},
+                       {'ordering': '-title', 'fields': 'tags,link'},
+                       {'search': 'Crème'},
+                       {'fields': 'image_variants'}]:
+            with self.subTest(params=params):
+                self.assertSameAsSerializer(RECIPES_URL, params)
+
+    def test_attribute_lists_match(self):
+        for params in [{}, {'ordering': 'popularity'}]:
+            fast = self.client.get(reverse('recipe:tag-list'), params)
+            cache.clear()
+            with patch.object(TagViewSet, 'fast_list', False), \
+                    patch.object(TagViewSet, 'renderer_classes',
+                                 [JSONRenderer]):
+                slow = self.client.get(reverse('recipe:tag-list'), params)
+
+            self.assertEqual(fast.content, slow.content)
+
+
+class RecipeDocumentTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.tag = create_tag(self.user, name='Dinner')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('3.20'), description='Hot')
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(
+            create_ingredient(self.user, name='Leek'))
+
+    def assertServedLikeSerializer(self, url):
+        cache.clear()
+        served = self.client.get(url)
+        with patch.object(RecipesViewSet, 'document_reads', False), \
+                patch.object(RecipesViewSet, 'fast_list', False):
+            cache.clear()
+            expected = self.client.get(url)
+
+        self.assertEqual(served.status_code, status.HTTP_200_OK)
+        self.assertEqual(served.content, expected.content)
+        return served
+
+    def test_document_written_on_create(self):
+        document = RecipeDocument.objects.get(recipe=self.recipe)
+
+        expected = RecipeDetailSerializer(self.recipe).data
+        # Added with the request's URLs as documents are served.
+        del expected['image_variants']
+        self.assertEqual(json.loads(document.detail), expected)
+        self.assertEqual(json.loads(document.summary)['tags'],
+                         [{'id': self.tag.id, 'name': 'Dinner'}])
+
+    def test_detail_served_from_document(self):
+        self.recipe.image_variants = {
+            'thumb': {'jpeg': 'uploads/recipe/a.jpg',
+                      'webp': 'uploads/recipe/a.webp'}}
+        self.recipe.save()
+
+        # The conditional GET validator and the document, no prefetches.
+        with self.assertMaxQueries(2):
+            self.client.get(detail_url(self.recipe.id))
+        res = self.assertServedLikeSerializer(detail_url(self.recipe.id))
+
+        self.assertTrue(res.data['image_variants']['thumb']['jpeg']
+                        .startswith('http://testserver/'))
+
+    def test_documents_follow_writes(self):
+        writes = [
+            lambda: self.client.patch(detail_url(self.recipe.id),
+                                      {'title': 'Broth'}, format='json'),
+            lambda: self.client.patch(
+                reverse('recipe:tag-detail', args=[self.tag.id]),
+                {'name': 'Supper'}),
+            lambda: self.recipe.tags.add(create_tag(self.user, name='Lunch')),
+            lambda: self.tag.recipe_set.clear(),
+            lambda: Ingredient.objects.filter(user=self.user).delete(),
+        ]
+        for write in writes:
+            write()
+            self.assertServedLikeSerializer(RECIPES_URL)
+            self.assertServedLikeSerializer(detail_url(self.recipe.id))
+
+        self.assertEqual(
+            json.loads(RecipeDocument.objects.get().detail)['tags'][0]
+            ['name'], 'Lunch')
+
+    def test_recipes_without_document_use_serializer(self):
+        RecipeDocument.objects.all().delete()
+
+        self.assertServedLikeSerializer(RECIPES_URL)
+        self.assertServedLikeSerializer(detail_url(self.recipe.id))
+
+    @override_settings(MEDIA_PROTECTED=False,
+                       MEDIA_URL='https://cdn.example.com/media/')
+    def test_image_urls_follow_media_settings(self):
+        self.recipe.image_variants = {
+            'thumb': {'jpeg': 'uploads/recipe/a.jpg'}}
+        self.recipe.save()
+
+        res = self.assertServedLikeSerializer(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['image_variants']['thumb']['jpeg'],
+                         'https://cdn.example.com/media/uploads/recipe/a.jpg')
+        self.assertServedLikeSerializer(RECIPES_URL)
+
+    def test_migrate_backfills_missing_documents(self):
+        RecipeDocument.objects.all().delete()
+
+        emit_post_migrate_signal(verbosity=0, interactive=False,
+                                 db='default')
+
+        self.assertTrue(
+            RecipeDocument.objects.filter(recipe=self.recipe).exists())
+        self.assertServedLikeSerializer(detail_url(self.recipe.id))
+
+    def test_bulk_create_writes_documents(self):
+        res = self.client.post(BULK_URL, bulk_payload(3), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(RecipeDocument.objects.count(), 4)
+        self.assertServedLikeSerializer(RECIPES_URL)
+
+
+class ExportRecipeApiTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            recipe = create_recipe(self.user, title=f'Recipe {i}')
+            recipe.tags.add(create_tag(self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                create_ingredient(self.user, name=f'Ingredient {i}'))
+        create_recipe(create_user(email='other@example.com'))
+
+    def test_export_ndjson(self):
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in
+                   b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([record['title'] for record in records],
+                         [f'Recipe {i}' for i in range(5)])
+        self.assertEqual(records[2]['tags'], ['Tag 2'])
+        self.assertEqual(records[2]['ingredients'], ['Ingredient 2'])
+
+    def test_export_csv(self):
+        res = self.client.get(EXPORT_URL, {'export_format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(json.loads(rows[0]['tags']), ['Tag 0'])
+
+    @patch('recipe.views.RecipesViewSet.export_chunk_size', 2)
+    def test_export_prefetches_per_chunk(self):
+        # one recipe query plus two prefetches for each of the 3 chunks
+        with self.assertMaxQueries(7):
+            res = self.client.get(EXPORT_URL)
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 5)
+
+    def test_export_invalid_format(self):
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ImageUploadTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -412,8 +1258,19 @@ class ImageUploadTest(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image_variants)
         self.recipe.image.delete()
 
+    def upload(self, size=(10, 10), color='black'):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size, color).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(image_upload_url(self.recipe.id),
+                                        {'image': image_file},
+                                        format='multipart')
+
     def test_upload_image(self):
         url = image_upload_url(self.recipe.id)
 
@@ -436,3 +1293,341 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def post_image(self, image, image_format='JPEG'):
+        with tempfile.NamedTemporaryFile() as image_file:
+            image.save(image_file, format=image_format)
+            image_file.seek(0)
+            return self.client.post(image_upload_url(self.recipe.id),
+                                    {'image': image_file},
+                                    format='multipart')
+
+    def test_upload_image_too_large(self):
+        noise = Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3))
+
+        with self.settings(IMAGE_UPLOAD_MAX_BYTES=2048):
+            res = self.post_image(noise, 'PNG')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2048 bytes', str(res.data['image']))
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_image_too_many_pixels(self):
+        with self.settings(IMAGE_UPLOAD_MAX_PIXELS=99):
+            res = self.post_image(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('99 pixels', str(res.data['image']))
+
+    def test_upload_image_unsupported_format(self):
+        res = self.post_image(Image.new('RGB', (10, 10)), 'GIF')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_validates_header_only(self):
+        with patch.object(ImageFile.ImageFile, 'load',
+                          side_effect=AssertionError('decoded')):
+            res = self.post_image(Image.new('RGB', (10, 10)), 'PNG')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_upload_image_generates_variants(self):
+        self.upload(size=(800, 400))
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        variants = res.data['image_variants']
+        self.assertEqual(set(variants), {'thumb', 'medium', 'large'})
+        self.assertEqual(set(variants['thumb']), {'jpeg', 'webp'})
+        self.assertTrue(variants['thumb']['webp'].startswith('http'))
+        self.recipe.refresh_from_db()
+        thumb = self.recipe.image_variants['thumb']['jpeg']
+        with Image.open(os.path.join(settings.MEDIA_ROOT, thumb)) as image:
+            self.assertEqual(image.size, (150, 75))
+        large = self.recipe.image_variants['large']['webp']
+        with Image.open(os.path.join(settings.MEDIA_ROOT, large)) as image:
+            self.assertEqual(image.size, (800, 400))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_upload_image_replaces_image_and_variants(self):
+        self.upload()
+        self.recipe.refresh_from_db()
+        old_image = self.recipe.image.path
+        old_thumb = os.path.join(
+            settings.MEDIA_ROOT, self.recipe.image_variants['thumb']['jpeg'])
+
+        self.upload(color='white')
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(os.path.exists(old_image))
+        self.assertFalse(os.path.exists(old_thumb))
+        self.assertIn('thumb', self.recipe.image_variants)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_rolled_back_variants_keep_old_files(self):
+        self.upload()
+        self.recipe.refresh_from_db()
+        old_thumb = os.path.join(
+            settings.MEDIA_ROOT, self.recipe.image_variants['thumb']['jpeg'])
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                self.assertRaises(RuntimeError), transaction.atomic():
+            images.store_variants(self.recipe.id, self.recipe.image.name,
+                                  {'thumb': {'jpeg': b'replacement'}})
+            raise RuntimeError('rolled back')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants['thumb']['jpeg'],
+                         os.path.relpath(old_thumb, settings.MEDIA_ROOT))
+        self.assertTrue(os.path.exists(old_thumb))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_identical_uploads_share_files(self):
+        self.upload()
+        other = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(image_upload_url(other.id),
+                                 {'image': image_file}, format='multipart')
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertTrue(os.path.exists(os.path.join(
+            settings.MEDIA_ROOT, self.recipe.image_variants['thumb']['jpeg'])))
+
+    def test_variants_null_until_generated(self):
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertIsNone(res.data['image_variants'])
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0)
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, format='JPEG')
+        self.recipe.image.save('photo.jpg', ContentFile(buffer.getvalue()))
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.settings_override = override_settings(
+            IMAGE_RENDITION_CACHE_DIR=cache_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(self.recipe.image.delete)
+        renditions.reset_size()
+
+    def get(self, **params):
+        accept = params.pop('accept', '*/*')
+        res = self.client.get(image_url(self.recipe.id), params,
+                              HTTP_ACCEPT=accept)
+        if res.status_code == status.HTTP_200_OK:
+            content = b''.join(res.streaming_content)
+            return res, Image.open(BytesIO(content))
+        return res, None
+
+    def test_resize_to_width(self):
+        res, image = self.get(width=200, format='jpeg')
+
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (200, 150))
+
+    def test_never_upscales(self):
+        res, image = self.get(width=2000, format='jpeg')
+
+        self.assertEqual(image.size, (800, 600))
+
+    def test_webp_negotiated_from_accept(self):
+        res, image = self.get(width=100, accept='image/webp,*/*')
+
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertEqual(image.format, 'WEBP')
+        self.assertIn('Accept', res['Vary'])
+
+        res, image = self.get(width=100, accept='image/png')
+        self.assertEqual(image.format, 'JPEG')
+
+    def test_rendition_cached_on_disk(self):
+        with patch('core.images.render_resized',
+                   wraps=images.render_resized) as render:
+            self.get(width=120, format='webp')
+            self.get(width=120, format='webp')
+            self.get(width=120, format='webp', quality=50)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_if_none_match_not_modified(self):
+        res, _ = self.get(width=120, format='jpeg')
+
+        again = self.client.get(image_url(self.recipe.id),
+                                {'width': 120, 'format': 'jpeg'},
+                                HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_parameters(self):
+        for params in [{}, {'width': 'wide'}, {'width': 0},
+                       {'width': 10000}, {'width': 100, 'format': 'gif'},
+                       {'width': 100, 'quality': 100}]:
+            res, _ = self.get(**params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_without_image_not_found(self):
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(image_url(recipe.id), {'width': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_evicts_least_recently_used(self):
+        self.get(width=100, format='jpeg')
+        size = sum(entry[0] for entry in renditions._scan())
+        first = renditions.rendition_path(
+            self.recipe.image.name, 100, 'jpeg', 85)
+        os.utime(first, (0, 0))
+
+        with self.settings(IMAGE_RENDITION_CACHE_MAX_BYTES=size * 2.5):
+            self.get(width=101, format='jpeg')
+            self.get(width=102, format='jpeg')
+
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(renditions.rendition_path(
+            self.recipe.image.name, 102, 'jpeg', 85)))
+
+    def test_concurrent_requests_render_once(self):
+        started = threading.Event()
+        release = threading.Event()
+        render_resized = images.render_resized
+
+        def slow_render(*args):
+            started.set()
+            release.wait(5)
+            return render_resized(*args)
+
+        results = []
+        with patch('core.images.render_resized',
+                   side_effect=slow_render) as render:
+            threads = [threading.Thread(target=lambda: results.append(
+                renditions.get_rendition(
+                    self.recipe.image.name, 90, 'jpeg', 85)))
+                for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            started.wait(5)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len(results), 4)
+        for rendition in results:
+            rendition.close()
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, format='JPEG')
+        self.content = buffer.getvalue()
+        self.recipe.image.save('photo.jpg', ContentFile(self.content))
+        self.addCleanup(self.recipe.image.delete)
+        self.name = self.recipe.image.name
+        self.url = media_url(self.recipe.id, self.name)
+
+    def test_serves_whole_file(self):
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(res['Content-Length']), len(self.content))
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    def test_serves_byte_range(self):
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(res['Content-Range'],
+                         f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(b''.join(res.streaming_content), self.content[10:20])
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(res.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        res = self.client.get(self.url, HTTP_RANGE='bytes=99999-')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_serves_whole_file(self):
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                              HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res['ETag']
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                              HTTP_IF_RANGE=etag)
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    def test_if_none_match_not_modified(self):
+        res = self.client.get(self.url)
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_hands_transfer_to_proxy(self):
+        with self.settings(MEDIA_SERVE_BACKEND='nginx'):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{self.name}')
+        self.assertEqual(res.content, b'')
+
+        with self.settings(MEDIA_SERVE_BACKEND='sendfile'):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'],
+                         self.recipe.image.storage.path(self.name))
+
+    def test_other_users_files_not_found(self):
+        other = create_recipe(user=get_user_model().objects.create_user(
+            'other@example.com', 'password123'))
+
+        res = self.client.get(media_url(other.id, self.name))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(media_url(self.recipe.id, 'recipe/other.jpg'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serializer_links_to_media_view(self):
+        self.recipe.image_variants = {'thumb': {'jpeg': self.name}}
+        self.recipe.save()
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertTrue(res.data['image_variants']['thumb']['jpeg'].endswith(
+            self.url))
@@ -1,12 +1,14 @@
-from core.models import Tag
+from core.models import Tag, Recipe
+from core.tests.utils import QueryBudgetMixin
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
-from recipe.serializers import TagSerializer
+from recipe.serializers import TagDetailSerializer
 from rest_framework import status
 from rest_framework.test import APIClient
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 TAG_MOCK_OBJECT = {'name': 'Sauce'}
 
 
@@ -34,7 +36,7 @@ class PublicTagApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagApiTests(TestCase):
+class PrivateTagApiTests(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = create_user()
@@ -47,7 +49,7 @@ class PrivateTagApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagDetailSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
@@ -83,6 +85,26 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(tag.name, payload['name'])
         self.assertEqual(tag.user, self.user)
 
+    def test_rename_to_existing_name(self):
+        create_tag(self.user, name='Dinner')
+        tag = create_tag(self.user, name='Lunch')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Lunch')
+
+    def test_update_keeping_name(self):
+        tag = create_tag(self.user, name='Dinner')
+        create_tag(create_user(email='other@example.com'), name='Lunch')
+
+        for name in ['Dinner', 'Lunch']:
+            res = self.client.put(detail_url(tag.id), {'name': name})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delete(self):
         tag = create_tag(user=self.user)
 
@@ -91,3 +113,100 @@ class PrivateTagApiTests(TestCase):
         res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Tag.objects.filter(user=self.user).exists())
+
+    def test_list_tags_query_budget(self):
+        for i in range(20):
+            create_tag(self.user, name=f'Tag {i}')
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 20)
+
+    def test_filter_assigned_only(self):
+        used = create_tag(self.user, name='Used')
+        create_tag(self.user, name='Unused')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5)
+        recipe.tags.add(used)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data], ['Used'])
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_filter_min_count_and_sort_by_popularity(self):
+        tags = [create_tag(self.user, name=name)
+                for name in ['Rare', 'Common', 'Unused']]
+        for count in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title='Soup', time_minutes=5, price=5)
+            recipe.tags.add(tags[1])
+            if not count:
+                recipe.tags.add(tags[0])
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(
+                TAGS_URL, {'min_count': 1, 'ordering': 'popularity'})
+
+        self.assertEqual([(item['name'], item['recipe_count'])
+                          for item in res.data],
+                         [('Common', 3), ('Rare', 1)])
+
+        res = self.client.get(TAGS_URL, {'min_count': 2})
+        self.assertEqual([item['name'] for item in res.data], ['Common'])
+
+    def test_invalid_filters(self):
+        for params in [{'assigned_only': 'yes'}, {'min_count': -1},
+                       {'ordering': 'id'}]:
+            res = self.client.get(TAGS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_prefix(self):
+        for name in ['Tomato', 'tofu', 'Toast', 'Bread']:
+            create_tag(self.user, name=name)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'TO'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data],
+                         ['Toast', 'tofu', 'Tomato'])
+
+    def test_autocomplete_tolerates_typos(self):
+        tomato = create_tag(self.user, name='Tomato')
+        create_tag(self.user, name='Bread')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tomtao'})
+
+        self.assertEqual(res.data, [{'id': tomato.id, 'name': 'Tomato'}])
+
+    def test_autocomplete_sees_writes(self):
+        create_tag(self.user, name='Tomato')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'to'})
+
+        create_tag(self.user, name='Tortilla')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tor'})
+
+        self.assertEqual([item['name'] for item in res.data], ['Tortilla'])
+
+    def test_autocomplete_limited_to_user(self):
+        other_user = create_user(email='other@example.com')
+        create_tag(other_user, name='Tomato')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom'})
+
+        self.assertEqual(res.data, [])
+
+    def test_autocomplete_served_from_memory(self):
+        for i in range(50):
+            create_tag(self.user, name=f'Tag {i}')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'tag'})
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL,
+                                  {'q': 'tag 1', 'limit': 5})
+
+        self.assertEqual(len(res.data), 5)
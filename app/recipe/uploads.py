@@ -0,0 +1,81 @@
+"""
+Memory-bounded image uploads.
+
+Uploads are streamed to a temporary file in `IMAGE_UPLOAD_CHUNK_SIZE`
+chunks whatever their size, and a file growing past
+`IMAGE_UPLOAD_MAX_BYTES` is dropped while it is still arriving.
+Validation then only parses the image header for its format and
+dimensions, so an oversized or bomb-like image is rejected before a
+single pixel is decoded.
+"""
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from django.utils.translation import gettext_lazy as _
+from PIL import Image
+from rest_framework import serializers
+
+UPLOAD_FORMATS = ['JPEG', 'PNG', 'WEBP']
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Write every file to disk in fixed chunks, skipping those over
+    `max_bytes`; the names of skipped fields are kept in `rejected`"""
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.chunk_size = settings.IMAGE_UPLOAD_CHUNK_SIZE
+        self.max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+        self.rejected = []
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.rejected.append(self.field_name)
+            self.file.close()
+            raise SkipFile()
+
+        return super().receive_data_chunk(raw_data, start)
+
+
+class HeaderValidatedImageField(serializers.FileField):
+    """An image field checking format, size and pixel count from the
+    header only, never decoding the image"""
+    default_error_messages = {
+        'invalid_image': _('Upload a valid image. The file you uploaded was '
+                           'either not an image or a corrupted image.'),
+        'format': _('Unsupported image format, use one of {formats}.'),
+        'max_bytes': _('Ensure the image is at most {max_bytes} bytes.'),
+        'max_pixels': _('Ensure the image has at most {max_pixels} pixels.'),
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        if file.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.fail('max_bytes', max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES)
+
+        source = (file.temporary_file_path()
+                  if hasattr(file, 'temporary_file_path') else file)
+        try:
+            with warnings.catch_warnings():
+                # The pixel limit below is stricter than Pillow's warning.
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                with Image.open(source) as image:
+                    image_format = image.format
+                    width, height = image.size
+        except Image.DecompressionBombError:
+            self.fail('max_pixels',
+                      max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS)
+        except (OSError, SyntaxError, ValueError):
+            self.fail('invalid_image')
+
+        if image_format not in UPLOAD_FORMATS:
+            self.fail('format', formats=', '.join(UPLOAD_FORMATS))
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.fail('max_pixels',
+                      max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS)
+
+        file.content_type = Image.MIME[image_format]
+        file.seek(0)
+        return file
@@ -1,48 +1,339 @@
-from core.models import Ingredient, Recipe, Tag
-from recipe.serializers import (IngredientSerializer, RecipeDetailSerializer,
-                                RecipeSerializer, TagSerializer, RecipeImageSerializer)
+from core import recipe_io
+from core.models import Ingredient, Recipe, RecipeStats, Tag
+from core.search import search_recipes
+from core.images import FORMATS
+from recipe import autocomplete, documents, media, renditions
+from recipe.cache import CachedListMixin
+from recipe.conditional import ConditionalGetMixin
+from recipe.fastpath import FastListMixin
+from recipe.pagination import KeysetPagination
+from recipe.uploads import BoundedTemporaryFileUploadHandler
+from recipe.serializers import (IngredientDetailSerializer,
+                                RecipeDetailSerializer, RecipeSerializer,
+                                RecipeStatsSerializer, TagDetailSerializer,
+                                RecipeImageSerializer)
 from rest_framework import mixins, status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from user.authentication import CachedTokenAuthentication
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import prefetch_related_objects
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+import os
 
 
-class BaseRecipeAttributeViewSet(mixins.UpdateModelMixin, mixins.DestroyModelMixin,
+class BaseRecipeAttributeViewSet(CachedListMixin, FastListMixin,
+                                 mixins.UpdateModelMixin,
+                                 mixins.DestroyModelMixin,
                                  mixins.ListModelMixin, viewsets.GenericViewSet):
     """Base viewset for recipe's attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    autocomplete_max_results = 50
+    orderings = {
+        '-name': ['-name'],
+        'name': ['name'],
+        'popularity': ['-recipe_count', '-name'],
+    }
+
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != 'list':
+            return queryset.order_by('-name')
+
+        # Answered from the (user, recipe_count, name) index, never from
+        # the link tables.
+        min_count = self._count_param('min_count')
+        if self._count_param('assigned_only'):
+            min_count = max(min_count, 1)
+        if min_count:
+            queryset = queryset.filter(recipe_count__gte=min_count)
+
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': [
+                f'Choose one of {", ".join(self.orderings)}.']})
+
+        return queryset.order_by(*self.orderings[ordering])
+
+    def _count_param(self, name):
+        try:
+            value = int(self.request.query_params.get(name, 0))
+        except ValueError:
+            raise ValidationError({name: ['A valid integer is required.']})
+        if value < 0:
+            raise ValidationError({name: ['Must not be negative.']})
+
+        return value
 
+    @action(methods=['GET'], detail=False, url_path='autocomplete')
+    def autocomplete(self, request):
+        """Suggest names starting with or close to `q`"""
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        limit = max(1, min(limit, self.autocomplete_max_results))
 
-class RecipesViewSet(viewsets.ModelViewSet):
+        if not term:
+            return Response([])
+
+        return Response(autocomplete.suggest(
+            self.queryset, request.user, term, limit))
+
+
+class RecipesViewSet(ConditionalGetMixin, CachedListMixin,
+                     documents.DocumentReadMixin, FastListMixin,
+                     viewsets.ModelViewSet):
     """View for manage recipe APIs"""
     serializer_class = RecipeDetailSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Recipe.objects.all()
+    pagination_class = KeysetPagination
+    ordering_fields = ['price', 'time_minutes', 'title', 'id']
+    ordering = '-id'
+    prefetch_actions = ['list', 'retrieve', 'update', 'partial_update']
+    sparse_actions = ['list', 'retrieve']
+    bulk_max_items = 1000
+    export_chunk_size = 1000
+    export_formats = {
+        'ndjson': (recipe_io.ndjson_lines, 'application/x-ndjson'),
+        'csv': (recipe_io.csv_lines, 'text/csv'),
+    }
+    image_qualities = {'jpeg': 85, 'webp': 80}
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(
+            user=self.request.user).order_by('-id')
+
+        fields = self.get_requested_fields()
+        if self.action in self.prefetch_actions:
+            # Ordered like the list's fast path renders them.
+            queryset = queryset.prefetch_related(*documents.prefetches(
+                [relation for relation in documents.RELATIONS
+                 if fields is None or relation in fields]))
+        if fields is not None:
+            queryset = queryset.only(*self.get_sparse_columns(fields))
+
+        if self.action == 'list' and self.get_search_terms():
+            queryset = search_recipes(queryset, self.get_search_terms())
+
+        return queryset
+
+    def get_requested_fields(self):
+        """Field names asked for with `?fields=`, None for all of them"""
+        value = self.request.query_params.get('fields')
+        if self.action not in self.sparse_actions or value is None:
+            return None
+
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        available = self.get_serializer_class().Meta.fields
+        if not names or not names.issubset(available):
+            raise ValidationError({'fields': [
+                f'Choose from {", ".join(available)}.']})
+
+        return names
+
+    def get_sparse_columns(self, fields):
+        """Columns to load for `fields`, plus those the pagination keys
+        on; relations are prefetched instead"""
+        columns = {'id'}
+        for name in fields | {self.get_ordering_key()}:
+            try:
+                field = Recipe._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(name)
+
+        return columns
+
+    def get_ordering_key(self):
+        """The field the list pages on, checked against the allowed
+        orderings before it reaches `values()`"""
+        if self.action != 'list' or self.paginator is None:
+            return self.get_ordering().lstrip('-')
+
+        return self.paginator.get_ordering(self.request, self).lstrip('-')
+
+    def get_row_columns(self):
+        return [self.get_ordering_key()]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_search_terms(self):
+        return self.request.query_params.get('search', '').strip()
+
+    def get_ordering(self):
+        if self.action == 'list' and self.get_search_terms():
+            return '-rank'
+
+        return self.ordering
+
+    def get_ordering_fields(self):
+        if self.action == 'list' and self.get_search_terms():
+            return self.ordering_fields + ['rank']
+
+        return self.ordering_fields
 
     def get_serializer_class(self):
         if self.action == 'list':
             return RecipeSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'stats':
+            return RecipeStatsSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create a list of recipes in one batch"""
+        if not isinstance(request.data, list):
+            raise ValidationError(
+                {'non_field_errors': ['Expected a list of recipes.']})
+        if len(request.data) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                f'At most {self.bulk_max_items} recipes per request.']})
+
+        atomic = request.query_params.get('atomic') in ['1', 'true']
+        items, errors = [], []
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                items.append(serializer.validated_data)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        if errors and (atomic or not items):
+            return Response({'created': [], 'errors': errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(many=True)
+        recipes = serializer.create(items)
+        prefetch_related_objects(recipes, 'tags', 'ingredients')
+
+        return Response(
+            {'created': serializer.to_representation(recipes),
+             'errors': errors},
+            status=(status.HTTP_207_MULTI_STATUS if errors
+                    else status.HTTP_201_CREATED))
+
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream every recipe of the user as NDJSON or CSV"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in self.export_formats:
+            raise ValidationError({'export_format': [
+                f'Choose one of {", ".join(self.export_formats)}.']})
+
+        render_lines, content_type = self.export_formats[export_format]
+        recipes = recipe_io.iter_recipes(
+            self.get_queryset().order_by('id'), self.export_chunk_size)
+        records = map(recipe_io.recipe_to_record, recipes)
+
+        response = StreamingHttpResponse(
+            render_lines(records), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_format}"')
+        return response
+
+    @action(methods=['GET'], detail=False, url_path='stats')
+    def stats(self, request):
+        """Summary of the user's recipes, read from one maintained row"""
+        stats = (RecipeStats.objects.filter(user=request.user).first()
+                 or RecipeStats(user=request.user))
+
+        return Response(self.get_serializer(stats).data)
+
+    @action(methods=['GET'], detail=True, url_path='image',
+            content_negotiation_class=(
+                renditions.IgnoreClientContentNegotiation))
+    def image(self, request, pk=None):
+        """Serve the recipe image resized to `width` pixels"""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound('Recipe has no image.')
+
+        image_format = request.query_params.get('format')
+        negotiated = image_format is None
+        if negotiated:
+            accept = request.META.get('HTTP_ACCEPT', '')
+            image_format = 'webp' if 'image/webp' in accept else 'jpeg'
+        elif image_format not in FORMATS:
+            raise ValidationError(
+                {'format': [f'Choose one of {", ".join(FORMATS)}.']})
+        width = self._int_param(
+            'width', None, 1, settings.IMAGE_RENDITION_MAX_WIDTH)
+        quality = self._int_param(
+            'quality', self.image_qualities[image_format], 1, 95)
+
+        path = renditions.rendition_path(
+            recipe.image.name, width, image_format, quality)
+        etag = quote_etag(os.path.basename(path))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = FileResponse(
+                renditions.get_rendition(
+                    recipe.image.name, width, image_format, quality),
+                content_type=f'image/{image_format}')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        if negotiated:
+            patch_vary_headers(response, ['Accept'])
+
+        return response
+
+    @action(methods=['GET'], detail=True, url_path=r'media/(?P<name>.+)',
+            content_negotiation_class=(
+                renditions.IgnoreClientContentNegotiation))
+    def media(self, request, pk=None, name=None):
+        """Serve the stored image or one of its variants"""
+        recipe = self.get_object()
+        if name not in media.recipe_files(recipe):
+            raise NotFound('Recipe has no such file.')
+
+        return media.serve(request, recipe.image.storage, name)
+
+    def _int_param(self, name, default, minimum, maximum):
+        value = self.request.query_params.get(name)
+        if value is None and default is not None:
+            return default
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: ['A valid integer is required.']})
+        if not minimum <= value <= maximum:
+            raise ValidationError(
+                {name: [f'Must be between {minimum} and {maximum}.']})
+
+        return value
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
+        handler = BoundedTemporaryFileUploadHandler()
+        request.upload_handlers = [handler]
+        data = request.data
+        if 'image' in handler.rejected:
+            raise ValidationError({'image': [
+                f'Ensure the image is at most {handler.max_bytes} bytes.']})
+
+        serializer = self.get_serializer(recipe, data=data)
 
         if serializer.is_valid():
             serializer.save()
@@ -53,11 +344,11 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
 class TagViewSet(BaseRecipeAttributeViewSet):
     """Manage tags in database"""
-    serializer_class = TagSerializer
+    serializer_class = TagDetailSerializer
     queryset = Tag.objects.all()
 
 
 class IngredientViewSet(BaseRecipeAttributeViewSet):
     """Manage ingredient in database"""
-    serializer_class = IngredientSerializer
+    serializer_class = IngredientDetailSerializer
     queryset = Ingredient.objects.all()
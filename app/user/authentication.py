@@ -0,0 +1,119 @@
+"""
+Token authentication without a database round trip per request.
+
+Resolved tokens are kept in two tiers: a small LRU in each process and the
+shared cache. Both hold the user's id and active flag together with the
+token's `auth` version at the time of the lookup; deleting the token or
+saving its user bumps that version, so both tiers drop the entry on its
+next use in every process sharing the cache. When the processes serving
+the app don't share one (see `core.versions.is_shared()`), a revoked
+token would stay valid elsewhere, so nothing is cached and every request
+looks the token up. Tokens are only ever stored and keyed as SHA-256
+digests, and no other user data is stored at all: the shared cache may
+be on disk.
+
+A cached lookup authenticates the request with a user holding only those
+two fields. Its other fields are deferred, and load on first access.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from core.versions import get_version, invalidate, is_shared
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+AUTH_NAMESPACE = 'auth'
+
+_tokens = OrderedDict()
+_lock = threading.Lock()
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _shared_key(digest):
+    return f'auth-token:{digest}'
+
+
+def forget_token(key):
+    """Retire a token's cached lookups in every tier and process"""
+    digest = _digest(key)
+    invalidate(AUTH_NAMESPACE, digest)
+    cache.delete(_shared_key(digest))
+    with _lock:
+        _tokens.pop(digest, None)
+
+
+def clear_local_cache():
+    with _lock:
+        _tokens.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in `TokenAuthentication` backed by the local and shared
+    token caches"""
+
+    def authenticate_credentials(self, key):
+        if not is_shared():
+            return super().authenticate_credentials(key)
+
+        digest = _digest(key)
+        entry = self._get_local(digest) or self._get_shared(digest)
+        if entry is None:
+            # Read the version before the lookup: a bump racing with it
+            # then leaves the new entry already stale instead of trusted.
+            version = get_version(AUTH_NAMESPACE, digest)
+            user, token = super().authenticate_credentials(key)
+            entry = (user.pk, user.is_active, version)
+            cache.set(_shared_key(digest), entry,
+                      settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            self._set_local(digest, entry)
+            return user, token
+
+        user_id, is_active, version = entry
+        if not is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        user = get_user_model().from_db(
+            None, ['id', 'is_active'], [user_id, is_active])
+        return user, self.get_model()(key=key, user=user)
+
+    def _is_current(self, digest, version):
+        return get_version(AUTH_NAMESPACE, digest) == version
+
+    def _get_local(self, digest):
+        with _lock:
+            entry = _tokens.get(digest)
+            if entry is None:
+                return None
+            expires, entry = entry
+            if expires < time.monotonic():
+                del _tokens[digest]
+                return None
+            _tokens.move_to_end(digest)
+
+        return entry if self._is_current(digest, entry[2]) else None
+
+    def _get_shared(self, digest):
+        entry = cache.get(_shared_key(digest))
+        if entry is None or not self._is_current(digest, entry[2]):
+            return None
+
+        self._set_local(digest, entry)
+        return entry
+
+    def _set_local(self, digest, entry):
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+        with _lock:
+            _tokens[digest] = (expires, entry)
+            _tokens.move_to_end(digest)
+            while len(_tokens) > settings.AUTH_TOKEN_CACHE_MAX_ENTRIES:
+                _tokens.popitem(last=False)
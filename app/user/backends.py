@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from user import hashing
+
+
+class PooledModelBackend(ModelBackend):
+    """`ModelBackend` verifying passwords in the hashing pool and
+    rehashing them when the preferred hasher or tier has changed"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Spend the same time as for an existing user, like
+            # ModelBackend does, so response times do not leak emails.
+            hashing.make_password(password)
+            return None
+
+        valid, needs_update = hashing.verify_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if needs_update:
+            # The same password hashed anew: like the rehash in
+            # AbstractBaseUser.check_password(), this is not a change the
+            # validators' password_changed() is told about.
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+
+        return user
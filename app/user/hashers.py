@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TieredPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the work factor of the `PASSWORD_HASHER_TIER`
+    setting. It keeps the `pbkdf2_sha256` algorithm name, so hashes from
+    any tier verify and are upgraded at the next sign-in once the tier
+    changes.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_TIERS[settings.PASSWORD_HASHER_TIER]
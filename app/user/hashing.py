@@ -0,0 +1,123 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2 is deliberately slow, so hashing and verification run in a small
+process pool shared by the whole process. At most `max_pending` jobs may
+be queued or running at once; beyond that a request is turned away with
+a 503 straight away instead of waiting behind a login burst and starving
+the rest of the traffic on the worker.
+
+`PASSWORD_HASHING_WORKERS = 0` hashes inline, which keeps tests and
+management commands free of child processes.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+
+
+class HashingUnavailable(exceptions.APIException):
+    status_code = 503
+    default_detail = _('Too many sign-ins in progress, try again shortly.')
+    default_code = 'hashing_unavailable'
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _verify_password(password, encoded):
+    """Return `(valid, needs_update)` for a password and its stored hash"""
+    if not hashers.check_password(password, encoded):
+        return False, False
+
+    preferred = hashers.get_hasher('default')
+    hasher = hashers.identify_hasher(encoded)
+    return True, (hasher.algorithm != preferred.algorithm or
+                  preferred.must_update(encoded))
+
+
+class HashingPool:
+    """A process pool admitting at most `max_pending` jobs at a time"""
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingUnavailable()
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def make_password(self, password):
+        return self.run(_make_password, password)
+
+    def verify_password(self, password, encoded):
+        return self.run(_verify_password, password, encoded)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker)
+
+            return self._executor
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(settings.PASSWORD_HASHING_WORKERS,
+                                settings.PASSWORD_HASHING_MAX_PENDING)
+
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def make_password(password):
+    return get_pool().make_password(password)
+
+
+def verify_password(password, encoded):
+    return get_pool().verify_password(password, encoded)
+
+
+def set_password(user, password):
+    """`user.set_password()` hashing in the pool. As with the original,
+    the next `save()` passes the new password to the validators'
+    `password_changed()`."""
+    user.password = make_password(password)
+    user._password = password
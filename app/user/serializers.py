@@ -1,6 +1,8 @@
 from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
 from django.utils.translation import gettext as _
 from rest_framework import serializers
+from user import hashing
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -14,19 +16,22 @@ class UserSerializer(serializers.ModelSerializer):
                 'min_length': 5}
         }
 
+    @transaction.atomic
     def create(self, validated_data):
-        return get_user_model().objects.create_user(**validated_data)
+        # Hash in the pool; create_user would do it on this thread.
+        password = validated_data.pop('password')
+        user = get_user_model().objects.create_user(**validated_data)
+        hashing.set_password(user, password)
+        user.save(update_fields=['password'])
+
+        return user
 
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
-
-        user = super().update(instance, validated_data)
-
         if password:
-            user.set_password(password)
-            user.save()
+            hashing.set_password(instance, password)
 
-        return user
+        return super().update(instance, validated_data)
 
 
 class AuthTokenSerializer(serializers.Serializer):
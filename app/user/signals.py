@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from user import hashing
+from user.authentication import forget_token
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Covers deactivation: cached lookups hold the user's active flag.
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list(
+                'key', flat=True):
+            forget_token(key)
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    if setting.startswith('PASSWORD_HASHING_'):
+        hashing.reset_pool()
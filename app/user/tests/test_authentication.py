@@ -0,0 +1,119 @@
+from core.tests.utils import QueryBudgetMixin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user import authentication
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class CachedTokenAuthenticationTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        authentication.clear_local_cache()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123', name='Name')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_lookup(self):
+        self.client.get(ME_URL)
+
+        # Only the profile itself is loaded.
+        with self.assertMaxQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_shared_tier_refills_local_cache(self):
+        self.client.get(ME_URL)
+        authentication.clear_local_cache()
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_holds_no_user_data(self):
+        self.client.get(ME_URL)
+
+        entry = cache.get(authentication._shared_key(
+            authentication._digest(self.token.key)))
+
+        self.assertEqual(entry[:2], (self.user.pk, True))
+        self.assertNotIn(self.user.password, repr(entry))
+        self.assertNotIn(self.user.email, repr(entry))
+
+    def test_cached_user_loads_fields_on_access(self):
+        auth = authentication.CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+
+        user, token = auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.user_id, self.user.pk)
+        self.assertEqual(user.get_deferred_fields(),
+                         {'password', 'last_login', 'is_superuser', 'email',
+                          'name', 'is_staff'})
+        self.assertEqual(user.email, self.user.email)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        self.client.get(TAGS_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_seen_by_next_request(self):
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'New name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New name')
+
+    def test_invalid_token_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(SERVER_PROCESSES=2)
+    def test_nothing_cached_without_a_shared_cache(self):
+        self.client.get(ME_URL)
+
+        # The token and the profile, as with plain TokenAuthentication.
+        with self.assertMaxQueries(2):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(authentication._tokens, {})
+
+    @override_settings(AUTH_TOKEN_CACHE_MAX_ENTRIES=1)
+    def test_local_cache_is_bounded(self):
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        other_token = Token.objects.create(user=other)
+
+        self.client.get(ME_URL)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token.key}')
+        self.client.get(ME_URL)
+
+        self.assertEqual(len(authentication._tokens), 1)
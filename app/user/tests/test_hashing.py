@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from user import hashing
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+TIERS = {'standard': 1000, 'strong': 2000}
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=0, PASSWORD_HASHER_TIERS=TIERS,
+                   PASSWORD_HASHER_TIER='standard')
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {'email': 'user@example.com',
+                        'password': 'testpass123'}
+
+    def test_register_and_sign_in(self):
+        self.client.post(CREATE_USER_URL, dict(self.payload, name='Name'))
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user = get_user_model().objects.get(email=self.payload['email'])
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_sign_in_rehashes_for_new_tier(self):
+        get_user_model().objects.create_user(**self.payload)
+
+        with self.settings(PASSWORD_HASHER_TIER='strong'):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user = get_user_model().objects.get(email=self.payload['email'])
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password(self.payload['password']))
+
+    def test_sign_in_upgrades_other_algorithm(self):
+        user = get_user_model().objects.create_user(email='user@example.com')
+        with self.settings(PASSWORD_HASHERS=[
+                'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            user.set_password(self.payload['password'])
+            user.save()
+
+        self.client.post(TOKEN_URL, self.payload)
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_wrong_password_not_rehashed(self):
+        user = get_user_model().objects.create_user(**self.payload)
+
+        with self.settings(PASSWORD_HASHER_TIER='strong'):
+            res = self.client.post(
+                TOKEN_URL, dict(self.payload, password='wrong'))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).password,
+                         user.password)
+
+    def test_saturated_pool_sheds_with_503(self):
+        get_user_model().objects.create_user(**self.payload)
+
+        with self.settings(PASSWORD_HASHING_MAX_PENDING=0):
+            res = self.client.post(TOKEN_URL, self.payload)
+            register = self.client.post(
+                CREATE_USER_URL, {'email': 'new@example.com',
+                                  'password': 'testpass123', 'name': 'New'})
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(register.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(get_user_model().objects.filter(
+            email='new@example.com').exists())
+
+
+class HashingPoolTests(TestCase):
+    def test_process_pool_round_trip(self):
+        pool = hashing.HashingPool(workers=1, max_pending=2)
+        try:
+            encoded = pool.make_password('testpass123')
+
+            self.assertEqual(pool.verify_password('testpass123', encoded),
+                             (True, False))
+            self.assertEqual(pool.verify_password('wrong', encoded),
+                             (False, False))
+        finally:
+            pool.shutdown()
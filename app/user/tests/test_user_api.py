@@ -3,6 +3,7 @@ from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from unittest.mock import patch
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -32,6 +33,18 @@ class PublicUserApiTests(TestCase):
         self.assertTrue(user.check_password(payload['password']))
         self.assertNotIn('password', res.data)
 
+    @patch('django.contrib.auth.password_validation.password_changed')
+    def test_create_user_notifies_validators(self, password_changed):
+        payload = {'email': 'email@email.com', 'password': 'testpass123',
+                   'name': 'Name'}
+
+        self.client.post(CREATE_USER_URL, payload)
+
+        password_changed.assert_called_once()
+        password, user = password_changed.call_args[0]
+        self.assertEqual(password, payload['password'])
+        self.assertEqual(user.email, payload['email'])
+
     def test_create_user_with_existing_email_error(self):
         payload = {
             'email': 'email@email.com',
@@ -155,3 +168,16 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @patch('django.contrib.auth.password_validation.password_changed')
+    def test_password_change_notifies_validators(self, password_changed):
+        self.client.patch(ME_URL, {'password': 'newtestpass123'})
+
+        password_changed.assert_called_once_with('newtestpass123', self.user)
+
+    @patch('django.contrib.auth.password_validation.password_changed')
+    def test_profile_change_does_not_notify_validators(self,
+                                                       password_changed):
+        self.client.patch(ME_URL, {'name': 'newName'})
+
+        password_changed.assert_not_called()